@@ -0,0 +1,100 @@
+"""
+JWT authentication without the per-request work.
+
+Verified tokens are kept in a bounded in-process LRU, so a token sent
+thousands of times is decoded and signature-checked once. Users come from
+a short-lived cache instead of the user table. Tokens carry the user's
+token_version ('tv' claim); bumping it (password change) revokes every
+token issued before, cached or not.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+TOKEN_VERSION_CLAIM = 'tv'
+
+
+class VersionedRefreshToken(RefreshToken):
+    """ Refresh token (and the access tokens derived from it) stamped with the user's token_version """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+class TokenLRU:
+    """ Thread-safe LRU of validated tokens keyed by the raw token """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, raw_token):
+        with self._lock:
+            token = self._tokens.get(raw_token)
+            if token is None:
+                return None
+            if token['exp'] <= time.time():
+                del self._tokens[raw_token]
+                return None
+            self._tokens.move_to_end(raw_token)
+            return token
+
+    def put(self, raw_token, token):
+        with self._lock:
+            self._tokens[raw_token] = token
+            self._tokens.move_to_end(raw_token)
+            while len(self._tokens) > self.maxsize:
+                self._tokens.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+
+
+validated_tokens = TokenLRU(settings.JWT_TOKEN_CACHE_SIZE)
+
+
+def user_cache_key(user_id):
+    return f'jwt-user:{user_id}'
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_validated_token(self, raw_token):
+        token = validated_tokens.get(raw_token)
+        if token is None:
+            token = super().get_validated_token(raw_token)
+            validated_tokens.put(raw_token, token)
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Raises for unknown and inactive users, which are therefore never cached
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.JWT_USER_CACHE_TIMEOUT)
+
+        if validated_token.get(TOKEN_VERSION_CLAIM, 0) != user.token_version:
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        return user
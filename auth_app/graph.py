@@ -0,0 +1,161 @@
+"""
+"People you may know" from an in-memory snapshot of the follow graph.
+
+The snapshot is a CSR adjacency (`indptr`/`indices` NumPy arrays over a
+dense index of user ids), so ranking a user's friend-of-friend candidates
+is a couple of array operations with no joins over auth_app_follow.
+
+Refreshing is incremental: a user's row is reloaded only when their stored
+num_following no longer matches the snapshot or they followed someone
+since it was taken; all other rows are reused as they are.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max
+
+from .models import CustomUser, Follow
+
+
+@dataclass
+class Suggestion:
+    user_id: int
+    score: float
+    mutual_count: int
+
+
+def _codes(values):
+    """ Integer code per value, 0 for blank, so equal non-blank values share a code """
+    lookup = {}
+    return np.array(
+        [lookup.setdefault(value.strip().lower(), len(lookup) + 1) if value and value.strip() else 0
+         for value in values],
+        dtype=np.int32,
+    )
+
+
+class FollowGraph:
+
+    def __init__(self, user_ids, professions, countries, sources, targets, built_at, last_follow_id):
+        self.user_ids = user_ids                # sorted int64 user ids; position = dense index
+        self.professions = professions
+        self.countries = countries
+        self.built_at = built_at
+        self.last_follow_id = last_follow_id
+
+        # Edges are kept as ids so a refresh can re-index them when users come and go;
+        # rows written between reading users and follows are left for the next refresh
+        present = np.isin(sources, user_ids) & np.isin(targets, user_ids)
+        sources, targets = sources[present], targets[present]
+        order = np.lexsort((targets, sources))
+        self.sources = sources[order]
+        self.targets = targets[order]
+        rows = np.searchsorted(self.user_ids, self.sources)
+        self.indices = np.searchsorted(self.user_ids, self.targets)
+        self.indptr = np.zeros(len(self.user_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.user_ids)), out=self.indptr[1:])
+
+    @classmethod
+    def build(cls):
+        return cls._load(previous=None)
+
+    def refresh(self):
+        """ A new snapshot reusing every row that has not changed since this one """
+        return self._load(previous=self)
+
+    @classmethod
+    def _load(cls, previous):
+        built_at = time.time()
+        users = list(
+            CustomUser.objects.order_by('id').values_list('id', 'num_following', 'profession', 'country')
+        )
+        user_ids = np.fromiter((row[0] for row in users), dtype=np.int64, count=len(users))
+        following = np.fromiter((row[1] for row in users), dtype=np.int64, count=len(users))
+        last_follow_id = Follow.objects.aggregate(last=Max('id'))['last'] or 0
+
+        if previous is None:
+            edges = Follow.objects.values_list('follower_id', 'following_id')
+            sources, targets = cls._edge_arrays(edges)
+        else:
+            known = np.isin(user_ids, previous.user_ids)
+            degree = np.zeros(len(user_ids), dtype=np.int64)
+            degree[known] = np.diff(previous.indptr)[np.searchsorted(previous.user_ids, user_ids[known])]
+            dirty = set(user_ids[(following != degree) | ~known].tolist())
+            dirty.update(
+                Follow.objects.filter(id__gt=previous.last_follow_id).values_list('follower_id', flat=True)
+            )
+            keep = ~np.isin(previous.sources, np.fromiter(dirty, dtype=np.int64, count=len(dirty)))
+            fresh_sources, fresh_targets = cls._edge_arrays(
+                Follow.objects.filter(follower_id__in=dirty).values_list('follower_id', 'following_id')
+            )
+            sources = np.concatenate([previous.sources[keep], fresh_sources])
+            targets = np.concatenate([previous.targets[keep], fresh_targets])
+
+        return cls(
+            user_ids,
+            _codes(row[2] for row in users),
+            _codes(row[3] for row in users),
+            sources, targets, built_at, last_follow_id,
+        )
+
+    @staticmethod
+    def _edge_arrays(edges):
+        pairs = np.array(list(edges), dtype=np.int64).reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    def following_of(self, index):
+        return self.indices[self.indptr[index]:self.indptr[index + 1]]
+
+    def suggestions(self, user_id, limit=20):
+        """ Friend-of-friend candidates, best first """
+        index = np.searchsorted(self.user_ids, user_id)
+        if index >= len(self.user_ids) or self.user_ids[index] != user_id:
+            return []
+        followed = self.following_of(index)
+        if not len(followed):
+            return []
+
+        # Every account followed by someone `user_id` follows, once per path: the rows of
+        # `followed` gathered in one fancy-indexing pass
+        starts = self.indptr[followed]
+        lengths = self.indptr[followed + 1] - starts
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        reach = self.indices[np.arange(lengths.sum()) + offsets]
+        candidates, mutual = np.unique(reach, return_counts=True)
+        wanted = ~np.isin(candidates, followed) & (candidates != index)
+        candidates, mutual = candidates[wanted], mutual[wanted]
+        if not len(candidates):
+            return []
+
+        same_profession = (self.professions[candidates] == self.professions[index]) & (self.professions[index] > 0)
+        same_country = (self.countries[candidates] == self.countries[index]) & (self.countries[index] > 0)
+        scores = mutual * (
+            1
+            + settings.SUGGESTION_PROFESSION_WEIGHT * same_profession
+            + settings.SUGGESTION_COUNTRY_WEIGHT * same_country
+        )
+        # Highest score first, then most mutuals, then oldest account
+        best = np.lexsort((candidates, -mutual, -scores))[:limit]
+        return [
+            Suggestion(int(self.user_ids[candidates[i]]), round(float(scores[i]), 4), int(mutual[i]))
+            for i in best
+        ]
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph(max_age=None):
+    """ This process's snapshot, refreshed incrementally once older than FOLLOW_GRAPH_MAX_AGE seconds """
+    global _graph
+    max_age = settings.FOLLOW_GRAPH_MAX_AGE if max_age is None else max_age
+    with _graph_lock:
+        if _graph is None:
+            _graph = FollowGraph.build()
+        elif time.time() - _graph.built_at >= max_age:
+            _graph = _graph.refresh()
+        return _graph
@@ -0,0 +1,139 @@
+"""
+Password hashing off the request threads.
+
+PBKDF2 with hundreds of thousands of iterations is CPU-bound, so login,
+signup and password resets hash in a bounded process pool instead of on the
+request thread. At most PASSWORD_HASHING_MAX_PENDING hashes may be queued or
+running; a request that finds no free slot within
+PASSWORD_HASHING_QUEUE_TIMEOUT seconds is answered with 503. A hash storm
+therefore stays contained and feed reads keep their CPU. Queue and hash times
+are counted for `stats()`.
+
+Worker processes never touch Django settings or models: the parent picks the
+hasher and salt and the child only runs its encode/verify.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, identify_hasher, is_password_usable
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+COUNTERS = ('hashed', 'rejected', 'queue_ms', 'hash_ms')
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins at the moment, try again shortly.'
+    default_code = 'hashing_busy'
+
+
+def get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the parent runs request and background threads
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            _slots = threading.BoundedSemaphore(settings.PASSWORD_HASHING_MAX_PENDING)
+        return _pool, _slots
+
+
+def _timed(func, *args):
+    """ Runs in the worker: the result with wall-clock start and end, to split queue from hash time """
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time()
+
+
+def _encode(hasher, password, salt):
+    return hasher.encode(password, salt)
+
+
+def _verify(hasher, password, encoded):
+    return hasher.verify(password, encoded)
+
+
+def _count(key, amount):
+    key = f'password-hashing:{key}'
+    if not cache.add(key, amount, timeout=None):
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            cache.set(key, amount, timeout=None)
+
+
+def _run(func, *args):
+    if not settings.PASSWORD_HASHING_OFFLOAD or settings.BACKGROUND_TASKS_EAGER:
+        return func(*args)
+
+    pool, slots = get_pool()
+    submitted = time.time()
+    if not slots.acquire(timeout=settings.PASSWORD_HASHING_QUEUE_TIMEOUT):
+        _count('rejected', 1)
+        raise HashingBusy()
+    try:
+        result, started, finished = pool.submit(_timed, func, *args).result()
+    finally:
+        slots.release()
+    _count('hashed', 1)
+    _count('queue_ms', round((started - submitted) * 1000))
+    _count('hash_ms', round((finished - started) * 1000))
+    return result
+
+
+def make_password(password):
+    """ django.contrib.auth.hashers.make_password() in the pool """
+    hasher = get_hasher('default')
+    return _run(_encode, hasher, password, hasher.salt())
+
+
+def check_password(password, encoded):
+    """ (valid, must_update) for `password` against the stored hash `encoded` """
+    if password is None or not is_password_usable(encoded):
+        return False, False
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False, False
+    if not _run(_verify, hasher, password, encoded):
+        return False, False
+    preferred = get_hasher('default')
+    return True, hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def check_user_password(user, password):
+    """ user.check_password(), including its upgrade of outdated hashes """
+    valid, must_update = check_password(password, user.password)
+    if must_update:
+        set_user_password(user, password)
+        user.save(update_fields=['password'])
+    return valid
+
+
+def set_user_password(user, password):
+    """ user.set_password(); the caller saves """
+    user.password = make_password(password)
+    # Lets save() notify the password validators, as set_password() does
+    user._password = password
+
+
+def stats():
+    values = {name: cache.get(f'password-hashing:{name}', 0) for name in COUNTERS}
+    hashed = values['hashed']
+    return {
+        'hashed': hashed,
+        'rejected': values['rejected'],
+        'avg_queue_ms': round(values['queue_ms'] / hashed, 1) if hashed else None,
+        'avg_hash_ms': round(values['hash_ms'] / hashed, 1) if hashed else None,
+    }
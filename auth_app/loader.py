@@ -0,0 +1,56 @@
+"""
+Per-request batching of the users embedded in responses.
+
+Posts, comments, resources, bookmarks and follows all embed a user. Rather
+than joining the user into every queryset and serializing the same author
+once per row, their serializers go through the request's UserLoader. List
+serializers `want()` the user ids of their page. The first `get()` then
+fetches every user wanted so far, across all serializers of the response,
+in one id__in query, and each distinct user is serialized once.
+"""
+from .models import CustomUser
+
+
+class UserLoader:
+
+    def __init__(self):
+        self._users = {}
+        self._pending = set()
+        self._serialized = {}
+
+    @classmethod
+    def for_request(cls, request):
+        """ The request's shared UserLoader """
+        if request is None:
+            return cls()
+        loader = getattr(request, '_user_loader', None)
+        if loader is None:
+            loader = request._user_loader = cls()
+        return loader
+
+    def want(self, user_ids):
+        """ Queue `user_ids` for the next fetch """
+        self._pending.update(user_id for user_id in user_ids if user_id is not None and user_id not in self._users)
+
+    def add(self, user):
+        """ Reuse a user that is already loaded, e.g. through select_related() """
+        self._users.setdefault(user.pk, user)
+        self._pending.discard(user.pk)
+
+    def get(self, user_id):
+        """ The user with `user_id`, or None; fetched along with everything wanted so far """
+        if user_id not in self._users:
+            self._pending.add(user_id)
+            found = CustomUser.objects.in_bulk(self._pending)
+            for pending_id in self._pending:
+                self._users[pending_id] = found.get(pending_id)
+            self._pending.clear()
+        return self._users[user_id]
+
+    def serialize(self, user_id, serializer_class, context):
+        """ `serializer_class(user).data`, computed once per user and serializer """
+        key = (serializer_class, user_id)
+        if key not in self._serialized:
+            user = self.get(user_id)
+            self._serialized[key] = serializer_class(user, context=context).data if user is not None else None
+        return self._serialized[key]
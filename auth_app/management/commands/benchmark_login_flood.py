@@ -0,0 +1,84 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from auth_app import hashing
+from auth_app.models import CustomUser
+
+BENCH_EMAIL = 'login-flood-benchmark@example.invalid'
+BENCH_PASSWORD = 'login-flood-benchmark'
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = "Measure /posts/ latency while logins flood the server, hashing inline and in the hashing pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=10, help="Duration of each run (default: 10)")
+        parser.add_argument('--logins', type=int, default=8, help="Threads logging in back to back (default: 8)")
+        parser.add_argument('--readers', type=int, default=2, help="Threads reading /posts/ (default: 2)")
+
+    def handle(self, *args, **options):
+        user = CustomUser(username=BENCH_EMAIL, email=BENCH_EMAIL)
+        hashing.set_user_password(user, BENCH_PASSWORD)
+        user.save()
+        try:
+            for label, offload in (('inline (before)', False), ('hashing pool (after)', True)):
+                with override_settings(PASSWORD_HASHING_OFFLOAD=offload, BACKGROUND_TASKS_EAGER=False):
+                    if offload:
+                        # Start the workers outside the measured window
+                        hashing.make_password('warm-up')
+                    self.report(label, *self.run(options))
+        finally:
+            user.delete()
+
+    def run(self, options):
+        stop = threading.Event()
+        reads, logins = [], []
+
+        def worker(samples, request):
+            client = Client()
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    request(client)
+                    samples.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+
+        login_url = reverse('email-password-auth')
+        posts_url = reverse('post-list-create')
+        threads = [
+            threading.Thread(target=worker, args=(logins, lambda client: client.post(
+                login_url, {'email': BENCH_EMAIL, 'password': BENCH_PASSWORD})))
+            for _ in range(options['logins'])
+        ] + [
+            threading.Thread(target=worker, args=(reads, lambda client: client.get(posts_url)))
+            for _ in range(options['readers'])
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return reads, logins, options['seconds']
+
+    def report(self, label, reads, logins, seconds):
+        if not reads:
+            self.stdout.write(f"{label}: no /posts/ request completed")
+            return
+        ms = [sample * 1000 for sample in reads]
+        self.stdout.write(
+            f"{label}: /posts/ p50 {statistics.median(ms):.1f} ms, p99 {percentile(ms, 99):.1f} ms "
+            f"({len(reads)} reads); {len(logins) / seconds:.1f} logins/s"
+        )
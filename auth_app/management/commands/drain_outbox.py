@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from auth_app.outbox import drain, purge_old
+
+
+class Command(BaseCommand):
+    help = "Deliver due outbox emails and delete old sent or failed ones, e.g. from cron or after a worker restart"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help="Number of old rows deleted per query (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        sent = drain()
+        purged = purge_old(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} emails, purged {purged} old ones."))
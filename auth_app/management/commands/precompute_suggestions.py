@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auth_app.graph import FollowGraph
+from auth_app.models import UserSuggestion
+
+
+class Command(BaseCommand):
+    help = "Rank friend-of-friend suggestions for every user and store the top N"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=settings.SUGGESTIONS_TOP_N,
+            help=f"Suggestions stored per user (default: {settings.SUGGESTIONS_TOP_N})",
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help="Number of users written per transaction (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        top, chunk_size = options['top'], options['chunk_size']
+        graph = FollowGraph.build()
+        user_ids = graph.user_ids.tolist()
+        stored = 0
+
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            rows = [
+                UserSuggestion(
+                    user_id=user_id, suggested_id=suggestion.user_id,
+                    score=suggestion.score, mutual_count=suggestion.mutual_count,
+                )
+                for user_id in chunk
+                for suggestion in graph.suggestions(user_id, top)
+            ]
+            with transaction.atomic():
+                UserSuggestion.objects.filter(user_id__in=chunk).delete()
+                UserSuggestion.objects.bulk_create(rows)
+            stored += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(f"Stored {stored} suggestions for {len(user_ids)} users."))
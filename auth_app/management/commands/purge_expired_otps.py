@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from auth_app.otp import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired one-time codes from the OTP table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help="Number of rows deleted per query (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        purged = purge_expired(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired OTPs."))
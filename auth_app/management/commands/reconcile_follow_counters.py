@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Q
+
+from auth_app.models import CustomUser, Follow
+from lablinker.queries import SubqueryCount
+
+COUNTERS = {
+    'num_followers': 'following',
+    'num_following': 'follower',
+}
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized follower/following counters on users"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help="Number of users checked per transaction (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        checked = repaired = 0
+
+        while True:
+            ids = list(
+                CustomUser.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            checked += len(ids)
+            repaired += self.reconcile_chunk(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} users, repaired {repaired}."))
+
+    def reconcile_chunk(self, ids):
+        actual = {
+            f'actual_{field}': SubqueryCount(Follow.objects.filter(**{side: OuterRef('pk')}).values('id'))
+            for field, side in COUNTERS.items()
+        }
+        drifted = Q()
+        for field in COUNTERS:
+            drifted |= ~Q(**{field: F(f'actual_{field}')})
+
+        with transaction.atomic():
+            users = list(
+                CustomUser.objects.select_for_update()
+                .filter(id__in=ids)
+                .annotate(**actual)
+                .filter(drifted)
+                .only('id', *COUNTERS)
+            )
+            for user in users:
+                for field in COUNTERS:
+                    setattr(user, field, getattr(user, f'actual_{field}'))
+            CustomUser.objects.bulk_update(users, list(COUNTERS))
+        return len(users)
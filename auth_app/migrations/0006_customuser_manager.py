@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:37
+
+import auth_app.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0005_follow_customuser_following'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', auth_app.models.CustomUserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:44
+
+import mediastore.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0006_customuser_manager'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='avatar',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=mediastore.storage.media_storage, upload_to='avatars/'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:59
+
+from django.db import migrations, models
+from django.db.models import OuterRef
+
+from lablinker.queries import SubqueryCount
+
+
+def backfill_counters(apps, schema_editor):
+    CustomUser = apps.get_model('auth_app', 'CustomUser')
+    Follow = apps.get_model('auth_app', 'Follow')
+    CustomUser.objects.update(
+        num_followers=SubqueryCount(Follow.objects.filter(following=OuterRef('pk')).values('id')),
+        num_following=SubqueryCount(Follow.objects.filter(follower=OuterRef('pk')).values('id')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0008_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='num_followers',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='num_following',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
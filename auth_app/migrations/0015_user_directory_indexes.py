@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('auth_app', '0014_otp_attempts_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['profession', 'username', 'id'], name='user_profession_dir_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['country', 'username', 'id'], name='user_country_dir_idx'),
+        ),
+    ]
@@ -1,15 +1,41 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from cloudinary.models import CloudinaryField
+
+from mediastore.storage import media_storage
+
+
+class CustomUserQuerySet(models.QuerySet):
+    def adjust_follow_counters(self, followers=0, following=0):
+        """ Add `followers`/`following` (may be negative) to the stored counters of every user here """
+        changes = {}
+        if followers:
+            changes['num_followers'] = F('num_followers') + followers
+        if following:
+            changes['num_following'] = F('num_following') + following
+        return self.update(**changes) if changes else 0
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
+
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
     first_name = models.CharField(max_length=30, blank=True)
     last_name = models.CharField(max_length=30, blank=True)
-    avatar = CloudinaryField("image", blank=True, null=True)
+    avatar = models.FileField(upload_to='avatars/', storage=media_storage, max_length=255, blank=True, null=True)
+    avatar_renditions = models.JSONField(default=dict, blank=True)
     profession = models.CharField(max_length=50, blank=True)
     country = models.CharField(max_length=50, blank=True)
+    # Denormalized Follow counts, kept in step by the follow views and on user deletion
+    # (see auth_app/signals.py); `reconcile_follow_counters` repairs drift
+    num_followers = models.PositiveIntegerField(default=0)
+    num_following = models.PositiveIntegerField(default=0)
+    # Stamped into issued JWTs; bumping it revokes all of the user's tokens
+    token_version = models.PositiveIntegerField(default=0)
     
     # Follow system fields
     following = models.ManyToManyField(
@@ -19,16 +45,25 @@ class CustomUser(AbstractUser):
         symmetrical=False
     )
 
+    objects = CustomUserManager()
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Directory pages filtered on a facet, in username order (see user/directory.py)
+            models.Index(fields=['profession', 'username', 'id'], name='user_profession_dir_idx'),
+            models.Index(fields=['country', 'username', 'id'], name='user_country_dir_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
     @property
     def followers_count(self):
-        return self.followers.count()
+        return self.num_followers
     
     @property
     def following_count(self):
-        return self.following.count()
+        return self.num_following
 
 
 class Follow(models.Model):
@@ -47,15 +82,80 @@ class Follow(models.Model):
     class Meta:
         unique_together = ('follower', 'following')
         ordering = ['-created_at']
+        indexes = [
+            # Followers / following lists are paged newest first
+            models.Index(fields=['following', 'created_at', 'id'], name='follow_following_created_idx'),
+            models.Index(fields=['follower', 'created_at', 'id'], name='follow_follower_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.follower.email} follows {self.following.email}"
 
 
+class UserSuggestion(models.Model):
+    """ Precomputed "people you may know" for a user, see auth_app/graph.py """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='suggestions')
+    suggested = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    mutual_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='unique_user_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'], name='suggestion_user_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested_id} for {self.user_id}"
+
+
+class OutboxEmail(models.Model):
+    """ Mail waiting to be delivered by the 'mail' worker pool, see auth_app/outbox.py """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Earliest next delivery attempt; also serves as the lease of a worker sending it
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)}"
+
+
 class OTP(models.Model):
+    """ Table-backed one-time codes, used when OTP_STORE='database' (see auth_app/otp.py) """
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     code = models.CharField(max_length=6)
     expires_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'expires_at'], name='otp_user_expires_idx'),
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ]
 
     def __str__(self):
         return f"OTP for {self.user.email}"
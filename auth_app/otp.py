@@ -0,0 +1,123 @@
+"""
+One-time login codes.
+
+Each user has at most one active code: issuing a new one replaces the old.
+Codes expire after OTP_TTL seconds, and are used up by one successful
+verification or by OTP_MAX_ATTEMPTS guesses. By default
+(OTP_STORE='database') they live in the OTP table, whose expired rows are
+purged in chunks at most every OTP_PURGE_INTERVAL seconds.
+OTP_STORE='cache' keeps them in the cache instead, which handles expiry
+natively. It must be a cache every worker shares: with a per-process
+cache a code issued by one worker is unknown to the others, and each
+worker would allow its own OTP_MAX_ATTEMPTS guesses.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, get_random_string
+
+from lablinker import background
+from .models import OTP
+
+VALID = 'valid'
+INVALID = 'invalid'
+LOCKED = 'locked'
+
+# Cache backends that are not shared between worker processes
+PER_PROCESS_CACHES = (LocMemCache, DummyCache)
+
+
+class CacheStore:
+
+    @staticmethod
+    def keys(user_id):
+        return f'otp:{user_id}', f'otp-attempts:{user_id}'
+
+    def issue(self, user_id, code):
+        code_key, attempts_key = self.keys(user_id)
+        cache.set_many({code_key: code, attempts_key: 0}, settings.OTP_TTL)
+
+    def verify(self, user_id, code):
+        code_key, attempts_key = self.keys(user_id)
+        stored = cache.get(code_key)
+        if stored is None:
+            return INVALID
+        try:
+            attempts = cache.incr(attempts_key)
+        except ValueError:
+            # Expired between the two reads
+            return INVALID
+        if attempts > settings.OTP_MAX_ATTEMPTS:
+            cache.delete_many([code_key, attempts_key])
+            return LOCKED
+        # Only the request that actually deletes the code gets to use it
+        if not constant_time_compare(stored, code) or not cache.delete(code_key):
+            return INVALID
+        cache.delete(attempts_key)
+        return VALID
+
+
+class DatabaseStore:
+
+    def issue(self, user_id, code):
+        with transaction.atomic():
+            OTP.objects.filter(user_id=user_id).delete()
+            OTP.objects.create(user_id=user_id, code=code,
+                               expires_at=timezone.now() + timedelta(seconds=settings.OTP_TTL))
+        # Rows of users who never came back would pile up otherwise
+        if cache.add('otp-purge', True, settings.OTP_PURGE_INTERVAL):
+            background.submit_on_commit(purge_expired)
+
+    def verify(self, user_id, code):
+        otp = OTP.objects.filter(user_id=user_id, expires_at__gt=timezone.now()).order_by('-expires_at').first()
+        if otp is None:
+            return INVALID
+        # Conditional, so concurrent guesses cannot all slip under the limit
+        if not OTP.objects.filter(id=otp.id, attempts__lt=settings.OTP_MAX_ATTEMPTS).update(
+            attempts=F('attempts') + 1
+        ):
+            OTP.objects.filter(id=otp.id).delete()
+            return LOCKED
+        if not constant_time_compare(otp.code, code) or not OTP.objects.filter(id=otp.id).delete()[0]:
+            return INVALID
+        return VALID
+
+
+def get_store():
+    if settings.OTP_STORE == 'database':
+        return DatabaseStore()
+    if isinstance(caches['default'], PER_PROCESS_CACHES):
+        raise ImproperlyConfigured(
+            "OTP_STORE='cache' needs a cache shared by all workers; configure CACHE_BACKEND "
+            "or use OTP_STORE='database'"
+        )
+    return CacheStore()
+
+
+def issue_code(user):
+    """ Replace the user's active code with a fresh one and return it """
+    code = get_random_string(length=6, allowed_chars='1234567890')
+    get_store().issue(user.pk, code)
+    return code
+
+
+def verify_code(user, code):
+    """ VALID (and the code is used up), INVALID or LOCKED after too many attempts """
+    return get_store().verify(user.pk, str(code))
+
+
+def purge_expired(chunk_size=1000):
+    """ Delete expired OTP rows a chunk at a time; returns how many """
+    purged = 0
+    while True:
+        ids = list(OTP.objects.filter(expires_at__lte=timezone.now()).values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return purged
+        purged += OTP.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,165 @@
+"""
+Transactional email outbox.
+
+Views write an OutboxEmail row in the same transaction as whatever the mail
+is about (e.g. the OTP) and return; once it commits, the 'mail' pool drains
+due messages in batches over one reused backend connection. Failed messages
+are retried with exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS.
+Delivery is at least once: a worker that dies mid-batch leaves its claimed
+messages to be picked up again when their lease runs out. Bodies (OTP codes
+included) are blanked once a message is sent or given up on, and `purge_old`
+deletes those rows after EMAIL_OUTBOX_RETENTION.
+"""
+import logging
+import threading
+from contextlib import suppress
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from lablinker import background
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+_drain_lock = threading.Lock()
+_drain_requested = threading.Event()
+_retry_timer = None
+_retry_timer_lock = threading.Lock()
+
+
+def enqueue(subject, body, to, from_email=None):
+    """ Store a message for delivery once the current transaction commits """
+    email = OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email if from_email is not None else settings.EMAIL_HOST_USER,
+        to=list(to),
+    )
+    transaction.on_commit(request_drain)
+    return email
+
+
+def request_drain():
+    _drain_requested.set()
+    background.submit(drain, pool='mail')
+
+
+def drain():
+    """ Deliver every due message; returns how many were sent """
+    sent = 0
+    # One drainer per process: a request arriving while another drains is picked up by
+    # the running one when it re-checks the flag after releasing the lock
+    while _drain_lock.acquire(blocking=False):
+        try:
+            _drain_requested.clear()
+            sent += _send_due()
+        finally:
+            _drain_lock.release()
+        if not _drain_requested.is_set():
+            break
+    _schedule_retry()
+    return sent
+
+
+def _claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        OutboxEmail.objects.filter(id__in=[email.id for email in batch]).update(
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+        )
+    return batch
+
+
+def _send_due():
+    sent = 0
+    connection = None
+    try:
+        while True:
+            batch = _claim_batch(settings.EMAIL_OUTBOX_BATCH_SIZE)
+            if not batch:
+                return sent
+
+            delivered, failed = [], []
+            for email in batch:
+                email.attempts += 1
+                try:
+                    if connection is None:
+                        connection = get_connection(fail_silently=False)
+                        connection.open()
+                    connection.send_messages([
+                        EmailMessage(email.subject, email.body, email.from_email, email.to, connection=connection)
+                    ])
+                except Exception as exc:
+                    logger.warning("Delivery of outbox email %s failed (attempt %s/%s)", email.id,
+                                   email.attempts, settings.EMAIL_OUTBOX_MAX_ATTEMPTS, exc_info=True)
+                    email.last_error = repr(exc)[:1000]
+                    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                        email.status = OutboxEmail.STATUS_FAILED
+                        email.body = ''
+                    else:
+                        backoff = settings.EMAIL_OUTBOX_RETRY_BACKOFF * 2 ** (email.attempts - 1)
+                        email.next_attempt_at = timezone.now() + timedelta(seconds=backoff)
+                    failed.append(email)
+                    # The connection may be left mid-conversation; start the next message on a fresh one
+                    if connection is not None:
+                        with suppress(Exception):
+                            connection.close()
+                        connection = None
+                else:
+                    delivered.append(email.id)
+                    sent += 1
+
+            # Record delivered messages before anything else can go wrong
+            OutboxEmail.objects.filter(id__in=delivered).update(
+                status=OutboxEmail.STATUS_SENT, sent_at=timezone.now(), attempts=F('attempts') + 1,
+                last_error='', body='',
+            )
+            OutboxEmail.objects.bulk_update(failed, ['status', 'attempts', 'next_attempt_at', 'last_error', 'body'])
+    finally:
+        if connection is not None:
+            with suppress(Exception):
+                connection.close()
+
+
+def purge_old(chunk_size=1000):
+    """ Delete sent and failed messages older than EMAIL_OUTBOX_RETENTION a chunk at a time; returns how many """
+    cutoff = timezone.now() - timedelta(seconds=settings.EMAIL_OUTBOX_RETENTION)
+    done = OutboxEmail.objects.filter(
+        status__in=[OutboxEmail.STATUS_SENT, OutboxEmail.STATUS_FAILED], created_at__lt=cutoff
+    )
+    purged = 0
+    while True:
+        ids = list(done.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return purged
+        purged += OutboxEmail.objects.filter(id__in=ids).delete()[0]
+
+
+def _schedule_retry():
+    """ Wake the drainer when the earliest postponed message falls due """
+    global _retry_timer
+    if settings.BACKGROUND_TASKS_EAGER:
+        # Nothing runs behind the caller's back; `drain_outbox` delivers retries
+        return
+    next_at = OutboxEmail.objects.filter(status=OutboxEmail.STATUS_PENDING).aggregate(
+        next_at=Min('next_attempt_at')
+    )['next_at']
+    if next_at is None:
+        return
+    with _retry_timer_lock:
+        if _retry_timer is not None:
+            _retry_timer.cancel()
+        delay = max((next_at - timezone.now()).total_seconds(), 0) + 1
+        _retry_timer = threading.Timer(delay, request_drain)
+        _retry_timer.daemon = True
+        _retry_timer.start()
@@ -1,28 +1,69 @@
+from django.db.models.manager import BaseManager
 from rest_framework import serializers
+
+from lablinker.viewer_state import ViewerState
+from mediastore.renditions import preferred_url, rendition_urls, wants_originals
+from .loader import UserLoader
 from .models import CustomUser, Follow
 
+class UserListSerializer(serializers.ListSerializer):
+    """ Resolves whether the viewer follows each listed user in one query """
+
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, BaseManager) else data)
+        ViewerState.for_request(self.context.get('request')).prime('following', [user.id for user in users])
+        return super().to_representation(users)
+
 class UserSerializer(serializers.ModelSerializer):
     avatar_url = serializers.SerializerMethodField()
-    followers_count = serializers.ReadOnlyField()
-    following_count = serializers.ReadOnlyField()
+    avatar_srcset = serializers.SerializerMethodField()
+    avatar_original_url = serializers.SerializerMethodField()
+    followers_count = serializers.IntegerField(source='num_followers', read_only=True)
+    following_count = serializers.IntegerField(source='num_following', read_only=True)
     is_following = serializers.SerializerMethodField()
 
     def get_avatar_url(self, obj):
-        return obj.avatar.url if obj.avatar else None
-    
+        return preferred_url(obj.avatar, obj.avatar_renditions, 'thumb')
+
+    def get_avatar_srcset(self, obj):
+        return rendition_urls(obj.avatar_renditions)
+
+    def get_avatar_original_url(self, obj):
+        # Only on ?include_originals=true; the renditions cover normal display
+        if obj.avatar and wants_originals(self.context.get('request')):
+            return obj.avatar.url
+        return None
+
     def get_is_following(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.follower_relationships.filter(follower=request.user).exists()
-        return False
+        return ViewerState.for_request(self.context.get('request')).is_following(obj.id)
     
     class Meta:
         model = CustomUser
-        fields = ['id', 'email', 'username', 'first_name', 'last_name', 'profession', 'country', 'avatar', 'avatar_url', 'followers_count', 'following_count', 'is_following']
+        fields = ['id', 'email', 'username', 'first_name', 'last_name', 'profession', 'country', 'avatar', 'avatar_url', 'avatar_srcset', 'avatar_original_url', 'followers_count', 'following_count', 'is_following']
+        extra_kwargs = {'avatar': {'write_only': True}}
+        list_serializer_class = UserListSerializer
+
+class EmbeddedUserField(serializers.Field):
+    """
+    Read-only UserSerializer output of the foreign key named like the field, resolved through
+    the request's UserLoader; list serializers should `want()` the ids of their page.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        loader = UserLoader.for_request(self.context.get('request'))
+        field = instance._meta.get_field(self.field_name)
+        if field.is_cached(instance):
+            loader.add(getattr(instance, self.field_name))
+        return loader.serialize(getattr(instance, field.attname), UserSerializer, self.context)
 
 class FollowSerializer(serializers.ModelSerializer):
-    follower = UserSerializer(read_only=True)
-    following = UserSerializer(read_only=True)
+    follower = EmbeddedUserField()
+    following = EmbeddedUserField()
     
     class Meta:
         model = Follow
@@ -0,0 +1,28 @@
+"""
+Keep the stored follow counters (CustomUser.num_followers/num_following) right
+when a user is deleted and their Follow rows cascade away, and drop users
+cached by CachedJWTAuthentication whenever their row changes.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from .authentication import forget_user
+from .models import CustomUser
+
+
+def release_follow_counters(sender, instance, **kwargs):
+    # Runs inside the deletion's transaction, before the cascade removes the rows
+    CustomUser.objects.filter(following_relationships__following=instance).adjust_follow_counters(following=-1)
+    CustomUser.objects.filter(follower_relationships__follower=instance).adjust_follow_counters(followers=-1)
+
+
+def forget_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+    # Again after commit, in case a request re-cached the old row in between
+    transaction.on_commit(lambda: forget_user(instance.pk))
+
+
+def connect_signals():
+    pre_delete.connect(release_follow_counters, sender=CustomUser)
+    post_save.connect(forget_cached_user, sender=CustomUser)
+    post_delete.connect(forget_cached_user, sender=CustomUser)
@@ -1,3 +1,311 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .graph import FollowGraph
+from .loader import UserLoader
+from .otp import issue_code
+from .models import OTP, CustomUser, Follow, OutboxEmail, UserSuggestion
+from .serializers import UserSerializer
+
+
+class FollowCounterTestCase(TestCase):
+
+    def setUp(self):
+        self.alice, self.bob, self.carol = [
+            CustomUser.objects.create_user(username=name, email=f'{name}@example.com', password='testpassword123')
+            for name in ('alice', 'bob', 'carol')
+        ]
+        self.client = APIClient()
+
+    def follow(self, follower, following):
+        self.client.force_authenticate(follower)
+        response = self.client.post(reverse('follow-user', kwargs={'user_id': following.id}))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def counters(self, user):
+        user.refresh_from_db()
+        return user.followers_count, user.following_count
+
+    def test_counters_follow_views_and_user_deletion(self):
+        self.follow(self.alice, self.bob)
+        self.follow(self.carol, self.bob)
+        self.follow(self.bob, self.carol)
+        self.assertEqual(self.counters(self.bob), (2, 1))
+
+        self.client.force_authenticate(self.alice)
+        self.client.delete(reverse('unfollow-user', kwargs={'user_id': self.bob.id}))
+        self.assertEqual(self.counters(self.bob), (1, 1))
+
+        self.carol.delete()
+        self.assertEqual(self.counters(self.bob), (0, 0))
+
+    def test_reconcile_follow_counters_repairs_drift(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        CustomUser.objects.filter(id=self.carol.id).update(num_followers=5)
+
+        out = StringIO()
+        call_command('reconcile_follow_counters', chunk_size=2, stdout=out)
+
+        self.assertEqual(self.counters(self.bob), (1, 0))
+        self.assertEqual(self.counters(self.alice), (0, 1))
+        self.assertEqual(self.counters(self.carol), (0, 0))
+        self.assertIn('repaired 3', out.getvalue())
+
+
+class SuggestionTestCase(TestCase):
+
+    def setUp(self):
+        names = ['me', 'ann', 'ben', 'xia', 'yan', 'zoe']
+        self.users = {
+            name: CustomUser.objects.create_user(
+                username=name, email=f'{name}@example.com', password='testpassword123',
+                profession='virologist' if name in ('me', 'yan') else '',
+            )
+            for name in names
+        }
+        self.client = APIClient()
+        for follower, following in [('me', 'ann'), ('me', 'ben'), ('ann', 'xia'), ('ann', 'yan'),
+                                    ('ben', 'xia'), ('ben', 'zoe'), ('ben', 'me')]:
+            self.follow(follower, following)
+
+    def follow(self, follower, following):
+        self.client.force_authenticate(self.users[follower])
+        self.client.post(reverse('follow-user', kwargs={'user_id': self.users[following].id}))
+
+    def ranked(self, suggestions):
+        ids = {user.id: name for name, user in self.users.items()}
+        return [(ids[s.user_id], s.score, s.mutual_count) for s in suggestions]
+
+    def test_graph_ranks_friends_of_friends_and_refreshes_incrementally(self):
+        graph = FollowGraph.build()
+        me = self.users['me'].id
+        self.assertEqual(self.ranked(graph.suggestions(me)), [('xia', 2.0, 2), ('yan', 1.5, 1), ('zoe', 1.0, 1)])
+
+        self.follow('me', 'xia')
+        self.client.force_authenticate(self.users['ann'])
+        self.client.delete(reverse('unfollow-user', kwargs={'user_id': self.users['yan'].id}))
+        graph = graph.refresh()
+        self.assertEqual(self.ranked(graph.suggestions(me)), [('zoe', 1.0, 1)])
+
+    def test_endpoint_serves_precomputed_suggestions(self):
+        call_command('precompute_suggestions', top=2, stdout=StringIO())
+        me = self.users['me']
+        self.assertEqual(UserSuggestion.objects.filter(user=me).count(), 2)
+
+        self.follow('me', 'xia')  # Followed since the precompute: dropped from the response
+        # User, stored ranking, follows among the candidates, candidate rows
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('user-suggestions', kwargs={'user_id': me.id}))
+        self.assertEqual([(s['user']['username'], s['mutual_count']) for s in response.data], [('yan', 1)])
+
+        self.client.force_authenticate(self.users['ann'])
+        response = self.client.get(reverse('user-suggestions', kwargs={'user_id': me.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class FollowListTestCase(TestCase):
+
+    def setUp(self):
+        self.star = CustomUser.objects.create_user(username='star', email='star@example.com', password='pw')
+        self.fans = [
+            CustomUser.objects.create_user(username=f'fan{i}', email=f'fan{i}@example.com', password='pw')
+            for i in range(5)
+        ]
+        for fan in self.fans:
+            Follow.objects.create(follower=fan, following=self.star)
+        for fan in self.fans[:2]:
+            Follow.objects.create(follower=self.star, following=fan)
+        self.client = APIClient()
+        self.client.force_authenticate(self.fans[0])
+
+    def test_followers_are_paged_newest_first(self):
+        url = reverse('user-followers', kwargs={'user_id': self.star.id})
+        # User check, the page joined with its users, the viewer's follows among them
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'page_size': 3})
+        self.assertEqual([u['username'] for u in response.data['results']], ['fan4', 'fan3', 'fan2'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([u['username'] for u in response.data['results']], ['fan1', 'fan0'])
+        self.assertIsNone(response.data['next'])
+
+    def test_mutuals_are_followers_followed_back(self):
+        response = self.client.get(reverse('user-mutuals', kwargs={'user_id': self.star.id}))
+        self.assertEqual([u['username'] for u in response.data['results']], ['fan1', 'fan0'])
+        self.assertTrue(all(not u['is_following'] for u in response.data['results']))
+
+
+class CachedJWTAuthenticationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ada@example.com', email='ada@example.com', password='old-password-123')
+        self.client = APIClient()
+
+    def login(self, password):
+        response = self.client.post(reverse('email-password-auth'), {'email': 'ada@example.com', 'password': password})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['access']
+
+    def test_user_is_cached_until_password_reset_revokes_tokens(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.login("old-password-123")}')
+        url = reverse('user-following', kwargs={'user_id': self.user.id})
+        self.client.get(url)
+        # User check and the (empty) page only; the viewer comes from the cache
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('password-reset'), {
+            'current_password': 'old-password-123', 'new_password': 'new-password-456'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class EmailOutboxTestCase(TestCase):
+
+    def request_otp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post(reverse('otp-auth'), {'email': 'grace@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_otp_mail_is_delivered_from_the_outbox(self):
+        self.request_otp()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertRegex(mail.outbox[0].body, r'Your OTP code is \d{6}$')
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.status, email.body), (OutboxEmail.STATUS_SENT, ''))
+
+    def test_failed_delivery_is_retried_then_given_up(self):
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=ConnectionError('smtp down')):
+            self.request_otp()
+            email = OutboxEmail.objects.get()
+            self.assertEqual((email.status, email.attempts), (OutboxEmail.STATUS_PENDING, 1))
+            self.assertGreater(email.next_attempt_at, timezone.now())
+
+            OutboxEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+            call_command('drain_outbox', stdout=StringIO())
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), (OutboxEmail.STATUS_FAILED, 2))
+            self.assertIn('smtp down', email.last_error)
+            self.assertEqual(email.body, '')
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(EMAIL_OUTBOX_RETENTION=3600)
+    def test_drain_purges_old_finished_messages(self):
+        old = timezone.now() - timedelta(hours=2)
+        for status_ in (OutboxEmail.STATUS_SENT, OutboxEmail.STATUS_FAILED, OutboxEmail.STATUS_PENDING):
+            OutboxEmail.objects.create(subject='s', body='b', to=['a@example.com'], status=status_,
+                                       next_attempt_at=timezone.now() + timedelta(hours=1))
+        OutboxEmail.objects.update(created_at=old)
+        recent = OutboxEmail.objects.create(subject='s', body='', to=['a@example.com'], status=OutboxEmail.STATUS_SENT)
+
+        out = StringIO()
+        call_command('drain_outbox', chunk_size=1, stdout=out)
+        self.assertIn('purged 2 old ones', out.getvalue())
+        self.assertQuerySetEqual(
+            OutboxEmail.objects.order_by('id').values_list('status', flat=True),
+            [OutboxEmail.STATUS_PENDING, recent.status],
+        )
+
+
+@override_settings(OTP_MAX_ATTEMPTS=2)
+class OTPTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='lin', email='lin@example.com', password='pw')
+        self.client = APIClient()
+
+    def verify(self, code):
+        return self.client.post(reverse('verify-otp'), {'email': 'lin@example.com', 'otp': code}).status_code
+
+    def wrong(self, code):
+        return '000000' if code != '000000' else '111111'
+
+    def check_single_active_code_and_attempts(self):
+        old = issue_code(self.user)
+        code = issue_code(self.user)
+        if old != code:
+            self.assertEqual(self.verify(old), status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.verify(code), status.HTTP_200_OK)
+        # Used up
+        self.assertEqual(self.verify(code), status.HTTP_400_BAD_REQUEST)
+
+        code = issue_code(self.user)
+        self.assertEqual(self.verify(self.wrong(code)), status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.verify(self.wrong(code)), status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.verify(code), status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(OTP_STORE='cache')
+    def test_cache_store(self):
+        # The test cache is local memory, which a deployment must not use for codes
+        with self.assertRaises(ImproperlyConfigured):
+            issue_code(self.user)
+        with mock.patch('auth_app.otp.PER_PROCESS_CACHES', ()):
+            self.check_single_active_code_and_attempts()
+        self.assertFalse(OTP.objects.exists())
+
+    def test_database_store_and_purge(self):
+        self.check_single_active_code_and_attempts()
+
+        issue_code(self.user)
+        OTP.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.verify(OTP.objects.get().code), status.HTTP_400_BAD_REQUEST)
+        out = StringIO()
+        call_command('purge_expired_otps', chunk_size=1, stdout=out)
+        self.assertIn('Purged 1', out.getvalue())
+        self.assertFalse(OTP.objects.exists())
+
+
+class PasswordHashingTestCase(TestCase):
+
+    def test_signup_login_and_outdated_hash_upgrade(self):
+        client = APIClient()
+        credentials = {'email': 'kim@example.com', 'password': 'correct-horse-9'}
+        response = client.post(reverse('signup'), credentials)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = CustomUser.objects.get(email='kim@example.com')
+        self.assertTrue(user.check_password('correct-horse-9'))
+
+        self.assertEqual(client.post(reverse('email-password-auth'), {**credentials, 'password': 'wrong'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+        hasher = PBKDF2PasswordHasher()
+        user.password = hasher.encode('correct-horse-9', hasher.salt(), iterations=1000)
+        user.save()
+        response = client.post(reverse('email-password-auth'), credentials)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertEqual(user.password.split('$')[1], str(hasher.iterations))
+
+
+class UserLoaderTestCase(TestCase):
+
+    def test_wanted_users_are_fetched_together_and_serialized_once(self):
+        ids = [
+            CustomUser.objects.create_user(username=name, email=f'{name}@example.com', password='pw').id
+            for name in ('ivy', 'jon')
+        ]
+        loader = UserLoader()
+        loader.want(ids + [999])
+        with self.assertNumQueries(1):
+            first = loader.serialize(ids[0], UserSerializer, {})
+            self.assertEqual(loader.get(ids[1]).username, 'jon')
+            self.assertIsNone(loader.get(999))
+        self.assertIs(loader.serialize(ids[0], UserSerializer, {}), first)
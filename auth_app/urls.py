@@ -2,7 +2,8 @@ from django.urls import path
 from .views import (
     OTPAuthenticationView, OTPVerifyView, EmailPasswordAuthView, 
     PasswordResetView, SignupView, FollowUserView, UnfollowUserView,
-    UserFollowersView, UserFollowingView
+    UserFollowersView, UserFollowingView, UserMutualsView, UserSuggestionsView,
+    PasswordHashingStatsView
 )
 
 urlpatterns = [
@@ -11,10 +12,13 @@ urlpatterns = [
     path('login/', EmailPasswordAuthView.as_view(), name='email-password-auth'),
     path('signup/', SignupView.as_view(), name='signup'),
     path('password-reset/', PasswordResetView.as_view(), name='password-reset'),
+    path('hashing-stats/', PasswordHashingStatsView.as_view(), name='password-hashing-stats'),
     
     # Follow system URLs
     path('follow/<int:user_id>/', FollowUserView.as_view(), name='follow-user'),
     path('unfollow/<int:user_id>/', UnfollowUserView.as_view(), name='unfollow-user'),
     path('users/<int:user_id>/followers/', UserFollowersView.as_view(), name='user-followers'),
     path('users/<int:user_id>/following/', UserFollowingView.as_view(), name='user-following'),
+    path('users/<int:user_id>/mutuals/', UserMutualsView.as_view(), name='user-mutuals'),
+    path('users/<int:user_id>/suggestions/', UserSuggestionsView.as_view(), name='user-suggestions'),
 ]
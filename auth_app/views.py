@@ -1,19 +1,20 @@
-from django.conf import settings
-from django.core.mail import send_mail
-from django.utils.crypto import get_random_string
+from django.db import transaction
 from django.contrib.auth import get_user_model
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from datetime import timedelta
-from django.utils import timezone
 
 from auth_app.serializers import UserSerializer, FollowSerializer
-from .models import OTP, CustomUser, Follow
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import authenticate
+from .graph import Suggestion, get_graph
+from .models import CustomUser, Follow, UserSuggestion
+from . import hashing, otp, outbox
+from .authentication import VersionedRefreshToken
 from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import IsAuthenticated 
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from lablinker import background
+from lablinker.pagination import KeysetPagination
+from lablinker.viewer_state import ViewerState
+from posts.timeline import backfill_author, remove_author
 
 
 
@@ -26,47 +27,39 @@ class OTPAuthenticationView(APIView):
         
         #user, created = get_user_model().objects.get_or_create(email=email)
 
-        user, created = get_user_model().objects.get_or_create(
-            email=email,
-            defaults={
-                'username': email.split('@')[0]
-            })
-
-        otp_code = get_random_string(length=6, allowed_chars='1234567890')
-        otp_expiration = timezone.now() + timedelta(minutes=5)
-
-        otp_entry = OTP.objects.create(user=user, code=otp_code, expires_at=otp_expiration)
-
-        # Send OTP via email
-        send_mail(
-            'Your OTP Code',
-            f'Your OTP code is {otp_code}',
-            settings.EMAIL_HOST_USER,
-            [email],
-            fail_silently=False,
-        )
+        # The mail is only queued here and goes out once the OTP is committed
+        with transaction.atomic():
+            user, created = get_user_model().objects.get_or_create(
+                email=email,
+                defaults={
+                    'username': email.split('@')[0]
+                })
+            otp_code = otp.issue_code(user)
+            outbox.enqueue('Your OTP Code', f'Your OTP code is {otp_code}', [email])
 
         return Response({"detail": "OTP sent to email."}, status=status.HTTP_200_OK)
 
 class OTPVerifyView(APIView):
     def post(self, request):
         email = request.data.get('email')
-        otp = request.data.get('otp')
+        otp_code = request.data.get('otp')
 
-        if not email or not otp:
+        if not email or not otp_code:
             return Response({"detail": "Email and OTP are required."}, status=status.HTTP_400_BAD_REQUEST)
         
         user = get_user_model().objects.filter(email=email).first()
         if not user:
             return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        otp_entry = OTP.objects.filter(user=user, code=otp).first()
-
-        if not otp_entry or otp_entry.expires_at < timezone.now():
+        result = otp.verify_code(user, otp_code)
+        if result == otp.LOCKED:
+            return Response({"detail": "Too many attempts, request a new OTP."},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS)
+        if result != otp.VALID:
             return Response({"detail": "Invalid or expired OTP."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Generate JWT token
-        refresh = RefreshToken.for_user(user)
+        refresh = VersionedRefreshToken.for_user(user)
         access_token = refresh.access_token
 
         return Response({
@@ -94,18 +87,20 @@ class SignupView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create the user
+        # Create the user; the password is hashed in the hashing pool
         try:
-            user = get_user_model().objects.create_user(
-                username=email,  # Assuming username = email for simplicity
-                email=email,
-                password=password
+            User = get_user_model()
+            user = User(
+                username=User.normalize_username(email),  # Assuming username = email for simplicity
+                email=User.objects.normalize_email(email),
             )
+            hashing.set_user_password(user, password)
+            user.save()
         except ValidationError as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = VersionedRefreshToken.for_user(user)
 
         return Response(
             {
@@ -124,15 +119,17 @@ class EmailPasswordAuthView(APIView):
         if not email or not password:
             return Response({"detail": "Email and password are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        user = authenticate(request, username=email, password=password)
-
+        # What authenticate() does with ModelBackend, with the hashing in the hashing pool
+        user = CustomUser.objects.filter(username=email).first()
         if user is None:
+            # Hash anyway, so the response time does not tell whether the account exists
+            hashing.make_password(password)
+            return Response({"detail": "Invalid credentials."}, status=status.HTTP_400_BAD_REQUEST)
+        if not hashing.check_user_password(user, password) or not user.is_active:
             return Response({"detail": "Invalid credentials."}, status=status.HTTP_400_BAD_REQUEST)
 
-        authenticated_user = CustomUser.objects.get(email=email)
-
-        serialized_user = UserSerializer(authenticated_user)
-        refresh = RefreshToken.for_user(user)
+        serialized_user = UserSerializer(user)
+        refresh = VersionedRefreshToken.for_user(user)
         access_token = refresh.access_token
 
         return Response({
@@ -156,14 +153,21 @@ class PasswordResetView(APIView):
             return Response({"detail": "Current password and new password are required."}, status=status.HTTP_400_BAD_REQUEST)
         
         # check if current password is correct
-        if not user.check_password(current_password):
+        if not hashing.check_user_password(user, current_password):
             return Response({"detail": "Current password is incorrect."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # update password
-        user.set_password(new_password)
-        user.save()
+        # update password; tokens issued before this are revoked. request.user may come from
+        # the authentication cache, so only the changed columns are written.
+        hashing.set_user_password(user, new_password)
+        user.token_version += 1
+        user.save(update_fields=['password', 'token_version'])
 
-        return Response({"detail": "Password updated successfully."}, status=status.HTTP_200_OK)
+        refresh = VersionedRefreshToken.for_user(user)
+        return Response({
+            "detail": "Password updated successfully.",
+            "access": str(refresh.access_token),
+            "refresh": str(refresh)
+        }, status=status.HTTP_200_OK)
 
 class FollowUserView(APIView):
     permission_classes = [IsAuthenticated]
@@ -177,12 +181,17 @@ class FollowUserView(APIView):
         if request.user == user_to_follow:
             return Response({"detail": "You cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
         
-        follow, created = Follow.objects.get_or_create(
-            follower=request.user,
-            following=user_to_follow
-        )
+        with transaction.atomic():
+            follow, created = Follow.objects.get_or_create(
+                follower=request.user,
+                following=user_to_follow
+            )
+            if created:
+                CustomUser.objects.filter(id=request.user.id).adjust_follow_counters(following=1)
+                CustomUser.objects.filter(id=user_to_follow.id).adjust_follow_counters(followers=1)
         
         if created:
+            background.submit_on_commit(backfill_author, request.user.id, user_to_follow.id)
             return Response({"detail": "Successfully followed user."}, status=status.HTTP_201_CREATED)
         else:
             return Response({"detail": "Already following this user."}, status=status.HTTP_400_BAD_REQUEST)
@@ -196,32 +205,90 @@ class UnfollowUserView(APIView):
         except CustomUser.DoesNotExist:
             return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
         
-        try:
-            follow = Follow.objects.get(follower=request.user, following=user_to_unfollow)
-            follow.delete()
-            return Response({"detail": "Successfully unfollowed user."}, status=status.HTTP_200_OK)
-        except Follow.DoesNotExist:
-            return Response({"detail": "Not following this user."}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            # Only the request that actually removes the row adjusts the counters
+            if not Follow.objects.filter(follower=request.user, following=user_to_unfollow).delete()[0]:
+                return Response({"detail": "Not following this user."}, status=status.HTTP_400_BAD_REQUEST)
+            CustomUser.objects.filter(id=request.user.id).adjust_follow_counters(following=-1)
+            CustomUser.objects.filter(id=user_to_unfollow.id).adjust_follow_counters(followers=-1)
+        remove_author(request.user.id, user_to_unfollow.id)
+        return Response({"detail": "Successfully unfollowed user."}, status=status.HTTP_200_OK)
+
+def paginate_follows(request, follows, side, view=None):
+    """ A page of `follows` (Follow rows, newest first) serialized as the users on `side` """
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(follows.select_related(side), request, view=view)
+    serializer = UserSerializer([getattr(follow, side) for follow in page], many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 class UserFollowersView(APIView):
     def get(self, request, user_id):
-        try:
-            user = CustomUser.objects.get(id=user_id)
-        except CustomUser.DoesNotExist:
+        if not CustomUser.objects.filter(id=user_id).exists():
             return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
-        
-        followers = user.followers.all()
-        serializer = UserSerializer(followers, many=True, context={'request': request})
-        return Response(serializer.data)
+        return paginate_follows(request, Follow.objects.filter(following_id=user_id), 'follower', view=self)
 
 class UserFollowingView(APIView):
     def get(self, request, user_id):
-        try:
-            user = CustomUser.objects.get(id=user_id)
-        except CustomUser.DoesNotExist:
+        if not CustomUser.objects.filter(id=user_id).exists():
+            return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+        return paginate_follows(request, Follow.objects.filter(follower_id=user_id), 'following', view=self)
+
+class UserMutualsView(APIView):
+    """ Users who follow `user_id` back, newest follow first """
+    def get(self, request, user_id):
+        if not CustomUser.objects.filter(id=user_id).exists():
+            return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+        # Both sides are index lookups: the user's follows, semi-joined with their followers
+        follows = Follow.objects.filter(
+            follower_id=user_id,
+            following_id__in=Follow.objects.filter(following_id=user_id).values('follower_id'),
+        )
+        return paginate_follows(request, follows, 'following', view=self)
+
+class UserSuggestionsView(APIView):
+    """ "People you may know", from precompute_suggestions or the in-memory follow graph """
+    permission_classes = [IsAuthenticated]
+    default_limit = 20
+    max_limit = 50
+
+    def get(self, request, user_id):
+        if request.user.id != user_id and not request.user.is_staff:
+            return Response({"detail": "You can only view your own suggestions."}, status=status.HTTP_403_FORBIDDEN)
+        user = CustomUser.objects.filter(id=user_id).first()
+        if user is None:
             return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
-        
-        following = user.following.all()
-        serializer = UserSerializer(following, many=True, context={'request': request})
-        return Response(serializer.data)
 
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+        limit = max(limit, 1)
+
+        # Over-fetch so accounts followed since the ranking was computed can be dropped
+        suggestions = [
+            Suggestion(*row) for row in
+            UserSuggestion.objects.filter(user_id=user_id).order_by('-score', 'id')
+            .values_list('suggested_id', 'score', 'mutual_count')[:limit * 2]
+        ] or get_graph().suggestions(user_id, limit * 2)
+
+        state = ViewerState.for_request(request) if request.user.id == user_id else ViewerState(user)
+        state.prime('following', [suggestion.user_id for suggestion in suggestions])
+        suggestions = [s for s in suggestions if not state.is_following(s.user_id)][:limit]
+
+        users = CustomUser.objects.in_bulk([suggestion.user_id for suggestion in suggestions])
+        suggestions = [suggestion for suggestion in suggestions if suggestion.user_id in users]
+        serialized = UserSerializer(
+            [users[suggestion.user_id] for suggestion in suggestions], many=True, context={'request': request}
+        ).data
+        return Response([
+            {'user': data, 'score': suggestion.score, 'mutual_count': suggestion.mutual_count}
+            for data, suggestion in zip(serialized, suggestions)
+        ])
+
+
+class PasswordHashingStatsView(APIView):
+    """ Queue/hash time counters of the password hashing pool """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(hashing.stats(), status=status.HTTP_200_OK)
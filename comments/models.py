@@ -1,7 +1,22 @@
 from django.db import models
+from django.db.models import OuterRef
 from django.conf import settings
+from lablinker.queries import SubqueryCount
 from posts.models import Post
 
+
+class CommentQuerySet(models.QuerySet):
+    def for_thread(self):
+        """ Comments oldest first; authors are batched by auth_app.loader """
+        return self.order_by('created_at', 'id')
+
+    def with_reply_count(self):
+        """ Annotate how many direct replies each comment has """
+        return self.annotate(
+            reply_count=SubqueryCount(Comment.objects.filter(parent=OuterRef('pk')).values('id'))
+        )
+
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="comments")
@@ -10,5 +25,14 @@ class Comment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Top-level comments of a post, and replies to a comment, are paged oldest first
+            models.Index(fields=['post', 'parent', 'created_at', 'id'], name='comment_post_thread_idx'),
+            models.Index(fields=['parent', 'created_at', 'id'], name='comment_parent_created_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.author} on {self.post.title}"
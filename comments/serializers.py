@@ -1,19 +1,61 @@
+from django.db.models.manager import BaseManager
+from django.urls import reverse
 from rest_framework import serializers
 
-from auth_app.serializers import UserSerializer
+from auth_app.loader import UserLoader
+from auth_app.serializers import EmbeddedUserField
+from lablinker.viewer_state import ViewerState
 from .models import Comment
+from .threads import CommentPagination
+
+class CommentListSerializer(serializers.ListSerializer):
+    """ Loads the authors of the page and its inlined replies, and whether the viewer follows them """
+
+    def to_representation(self, data):
+        comments = list(data.all() if isinstance(data, BaseManager) else data)
+        author_ids = [comment.author_id for comment in comments]
+        for comment in comments:
+            author_ids.extend(reply.author_id for reply in getattr(comment, 'thread_replies', ()))
+        request = self.context.get('request')
+        ViewerState.for_request(request).prime('following', author_ids)
+        UserLoader.for_request(request).want(author_ids)
+        return super().to_representation(comments)
 
 class CommentSerializer(serializers.ModelSerializer):
-    author = UserSerializer(read_only=True)
+    author = EmbeddedUserField()
     replies = serializers.SerializerMethodField()
+    reply_count = serializers.SerializerMethodField()
+    replies_next = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
-        fields = ['id', 'post', 'author', 'content', 'created_at', 'updated_at', 'parent', 'replies']
+        fields = ['id', 'post', 'author', 'content', 'created_at', 'updated_at', 'parent', 'replies', 'reply_count', 'replies_next']
         read_only_fields = ['author', 'created_at', 'updated_at']
+        list_serializer_class = CommentListSerializer
+
+    def get_reply_count(self, obj):
+        # Annotated by Comment.objects.with_reply_count()
+        if hasattr(obj, 'reply_count'):
+            return obj.reply_count
+        return obj.replies.count()
+
+    def get_replies_next(self, obj):
+        """ Link to the replies not inlined in `replies`, if any """
+        inlined = getattr(obj, 'thread_replies', None)
+        if inlined is None or self.get_reply_count(obj) <= len(inlined):
+            return None
+        url = reverse('comment-replies', kwargs={'comment_id': obj.id})
+        request = self.context.get('request')
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        if not inlined:
+            return url
+        paginator = CommentPagination()
+        paginator.base_url = url
+        return paginator.encode_cursor(inlined[-1])
 
     def get_replies(self, obj):
-        """Retrieve replies to the comment."""
-        if obj.replies.exists():
-            return CommentSerializer(obj.replies.all(), many=True).data
+        """ The reply previews attached by comments.threads; the rest are paged via `replies_next` """
+        if hasattr(obj, 'thread_replies'):
+            return CommentSerializer(obj.thread_replies, many=True, context=self.context).data
         return []
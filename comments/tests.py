@@ -1,3 +1,69 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from posts.models import Post
+from .models import Comment
+
+
+@override_settings(COMMENT_REPLY_PREVIEW=2)
+class CommentThreadTestCase(TestCase):
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(
+                username=f'user{i}', email=f'user{i}@example.com', password='testpassword123'
+            )
+            for i in range(3)
+        ]
+        self.post = Post.objects.create(author=self.users[0], content='discussed')
+        self.client = APIClient()
+
+    def comment(self, content, parent=None, author=0):
+        return Comment.objects.create(post=self.post, author=self.users[author], content=content, parent=parent)
+
+    def test_top_level_page_inlines_reply_previews(self):
+        for i in range(5):
+            root = self.comment(f'root {i}', author=i % 3)
+            for j in range(3):
+                reply = self.comment(f'reply {i}.{j}', parent=root, author=(i + j) % 3)
+            self.comment(f'nested {i}', parent=reply)
+
+        url = reverse('comment-list-create', kwargs={'post_id': self.post.id})
+        # Post lookup, ETag validators, page, reply previews, then all their authors at once
+        with self.assertNumQueries(5):
+            first_page = self.client.get(url, {'page_size': 3})
+
+        page = first_page.data['results']
+        self.assertEqual([c['content'] for c in page], ['root 0', 'root 1', 'root 2'])
+        self.assertEqual(page[2]['reply_count'], 3)
+        self.assertEqual([r['content'] for r in page[2]['replies']], ['reply 2.0', 'reply 2.1'])
+        self.assertEqual(page[2]['replies'][0]['author']['username'], 'user2')
+        self.assertEqual(page[2]['replies'][1]['replies'], [])
+
+        # The link continues after the inlined replies, and deeper levels page the same way
+        response = self.client.get(page[2]['replies_next'])
+        reply = response.data['results'][0]
+        self.assertEqual([r['content'] for r in response.data['results']], ['reply 2.2'])
+        self.assertEqual((reply['reply_count'], reply['replies'][0]['content']), (1, 'nested 2'))
+        self.assertIsNone(reply['replies_next'])
+
+        response = self.client.get(first_page.data['next'])
+        self.assertEqual([c['content'] for c in response.data['results']], ['root 3', 'root 4'])
+
+    def test_detail_inlines_previews_only(self):
+        root = self.comment('root')
+        for i in range(6):
+            reply = self.comment(f'reply {i}', parent=root, author=i % 3)
+            for j in range(4):
+                self.comment(f'nested {i}.{j}', parent=reply)
+
+        # Comment, reply previews, then their authors at once; whatever the size of the subtree
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('comment-detail', kwargs={'comment_id': root.id}))
+        self.assertEqual(response.data['reply_count'], 6)
+        self.assertEqual([r['content'] for r in response.data['replies']], ['reply 0', 'reply 1'])
+        self.assertEqual(response.data['replies'][0]['reply_count'], 4)
+        self.assertEqual(response.data['replies'][0]['replies'], [])
+        self.assertIsNotNone(response.data['replies_next'])
@@ -0,0 +1,57 @@
+"""
+Comment threads, paged one level at a time.
+
+A page holds comments of one level (a post's top-level comments, or the
+replies to one comment), each annotated with `reply_count` and carrying
+its first COMMENT_REPLY_PREVIEW replies, so a response stays bounded no
+matter how large the thread grows. Deeper levels are fetched from
+/comments/<id>/replies/.
+"""
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from lablinker.pagination import KeysetPagination
+from .models import Comment
+
+
+class CommentPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
+
+
+def build_tree(comments):
+    """
+    Attach each comment's direct replies as `thread_replies` and return the
+    top-level comments; O(n), keeps the order of `comments` among siblings.
+    """
+    by_id = {}
+    for comment in comments:
+        comment.thread_replies = []
+        by_id[comment.id] = comment
+
+    roots = []
+    for comment in comments:
+        parent = by_id.get(comment.parent_id)
+        if parent is not None:
+            parent.thread_replies.append(comment)
+        else:
+            roots.append(comment)
+    return roots
+
+
+def attach_reply_previews(comments, limit=None):
+    """ Attach the first `limit` replies of every comment in `comments`, in one query """
+    limit = settings.COMMENT_REPLY_PREVIEW if limit is None else limit
+    previews = []
+    if comments and limit > 0:
+        previews = list(
+            Comment.objects.filter(parent_id__in=[comment.id for comment in comments])
+            .annotate(preview_rank=Window(
+                RowNumber(), partition_by=F('parent_id'), order_by=[F('created_at'), F('id')],
+            ))
+            .filter(preview_rank__lte=limit)
+            .with_reply_count()
+            .for_thread()
+        )
+    build_tree(list(comments) + previews)
+    return comments
@@ -1,24 +1,45 @@
+from django.db import transaction
+from django.db.models import Count, F, Max
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework import status
+from lablinker.conditional import ConditionalGetMixin
 from .models import Comment
 from .serializers import CommentSerializer
+from .threads import CommentPagination, attach_reply_previews
+from posts import cache as post_cache
 from posts.models import Post
 
-class CommentListCreateView(APIView):
+def paginate_thread(request, comments, view=None):
+    paginator = CommentPagination()
+    page = attach_reply_previews(paginator.paginate_queryset(comments, request, view=view))
+    serializer = CommentSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+class CommentListCreateView(ConditionalGetMixin, APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    def get_validators(self, request):
+        if 'post_id' not in self.kwargs:
+            return None
+        stats = Comment.objects.filter(post_id=self.kwargs['post_id']).aggregate(
+            total=Count('id'), latest=Max('updated_at')
+        )
+        # Comments embed their authors, whose edits and follower counts bump the collection version.
+        # No Last-Modified: deleting an older comment leaves Max(updated_at) unchanged.
+        return (stats['total'], stats['latest'], post_cache.collection_version()), None
+
     def get(self, request, post_id, *args, **kwargs):
-        """Retrieve all comments for a specific post."""
+        """Retrieve a page of a post's top-level comments, each with its first few replies."""
         try:
             post = Post.objects.get(id=post_id)
         except Post.DoesNotExist:
             return Response({"detail": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        comments = Comment.objects.filter(post=post, parent=None)  # Only top-level comments
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        comments = Comment.objects.filter(post=post, parent=None).with_reply_count().for_thread()
+        return paginate_thread(request, comments, view=self)
 
     def post(self, request, *args, **kwargs):
         """Add a new comment to a post (requires authentication)."""
@@ -35,7 +56,9 @@ class CommentListCreateView(APIView):
 
         serializer = CommentSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(author=request.user, post=post)
+            with transaction.atomic():
+                serializer.save(author=request.user, post=post)
+                Post.objects.filter(id=post.id).update(comment_count=F('comment_count') + 1)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -51,13 +74,15 @@ class CommentDetailView(APIView):
             return None
 
     def get(self, request, comment_id, *args, **kwargs):
-        """Retrieve a specific comment."""
-        comment = self.get_object(comment_id)
+        """Retrieve a specific comment with its first few replies, like a thread page."""
+        comment = Comment.objects.filter(id=comment_id).with_reply_count().first()
         if not comment:
             return Response({"detail": "Comment not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = CommentSerializer(comment)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        attach_reply_previews([comment])
+        # As a one-item list, so its author and the previews' authors are loaded together
+        serializer = CommentSerializer([comment], many=True, context={'request': request})
+        return Response(serializer.data[0], status=status.HTTP_200_OK)
 
     def patch(self, request, comment_id, *args, **kwargs):
         """Edit a comment (only by the author)."""
@@ -84,5 +109,21 @@ class CommentDetailView(APIView):
         if comment.author != request.user and not request.user.is_staff:
             return Response({"detail": "You are not allowed to delete this comment."}, status=status.HTTP_403_FORBIDDEN)
 
-        comment.delete()
+        with transaction.atomic():
+            # Replies cascade with their parent, so count everything that went
+            _, deleted = comment.delete()
+            removed = deleted.get(Comment._meta.label, 0)
+            Post.objects.filter(id=comment.post_id).update(comment_count=F('comment_count') - removed)
         return Response({"message": "Comment deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
+
+
+class CommentRepliesView(APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request, comment_id, *args, **kwargs):
+        """Retrieve a page of direct replies to a comment, each with its first few replies."""
+        if not Comment.objects.filter(id=comment_id).exists():
+            return Response({"detail": "Comment not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        replies = Comment.objects.filter(parent_id=comment_id).with_reply_count().for_thread()
+        return paginate_thread(request, replies, view=self)
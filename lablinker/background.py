@@ -0,0 +1,46 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(pool='default'):
+    """ Bounded thread pool `pool`, sized by BACKGROUND_TASK_POOLS (default: BACKGROUND_TASK_WORKERS) """
+    with _executors_lock:
+        if pool not in _executors:
+            _executors[pool] = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_TASK_POOLS.get(pool, settings.BACKGROUND_TASK_WORKERS),
+                thread_name_prefix=f'lablinker-{pool}',
+            )
+        return _executors[pool]
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(func, '__qualname__', func))
+        raise
+    finally:
+        # Worker threads get their own DB connections; don't leave them open between tasks.
+        connections.close_all()
+
+
+def submit(func, *args, pool='default', **kwargs):
+    """ Run `func` on a worker pool (inline when BACKGROUND_TASKS_EAGER is set) """
+    if settings.BACKGROUND_TASKS_EAGER:
+        return func(*args, **kwargs)
+    return get_executor(pool).submit(_run, func, args, kwargs)
+
+
+def submit_on_commit(func, *args, pool='default', **kwargs):
+    """ Queue `func` once the current transaction commits, so the task sees the rows it needs """
+    transaction.on_commit(lambda: submit(func, *args, pool=pool, **kwargs))
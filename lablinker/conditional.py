@@ -0,0 +1,98 @@
+"""
+Conditional GET (ETag / Last-Modified) for read endpoints.
+
+Views mixing in ConditionalGetMixin implement get_validators() with
+something cheap -- aggregates over the listed rows or a version counter --
+and a matching If-None-Match / If-Modified-Since is answered with 304
+before any serialization happens.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from lablinker import viewer_state
+
+
+def version_timeout():
+    """
+    Lifetime of version counters. A per-process cache never sees other
+    workers' bumps, so there a counter expires after CONDITIONAL_VERSION_TIMEOUT
+    seconds, which bounds how long a worker can answer 304 for stale data.
+    """
+    if isinstance(caches['default'], (LocMemCache, DummyCache)):
+        return settings.CONDITIONAL_VERSION_TIMEOUT
+    return None
+
+
+def get_version(key):
+    """ Current value of the version counter `key` """
+    # A clock-based first version keeps an evicted or expired counter from reusing an old stamp
+    cache.add(key, time.time_ns(), timeout=version_timeout())
+    return cache.get(key)
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=version_timeout())
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+    default_detail = 'Not modified.'
+
+
+class ConditionalGetMixin:
+    """
+    get_validators(request) returns (parts, last_modified) or None to skip.
+    `parts` is hashed into the ETag together with the viewer, the viewer's
+    like/bookmark/follow version and the query string; `last_modified` is an
+    aware datetime or None. Only give a timestamp that moves on every change,
+    deletions included: If-Modified-Since alone is trusted with it.
+    """
+    validators = None
+
+    def get_validators(self, request):
+        """ Override in views; the default skips conditional handling """
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD'):
+            return
+        validators = self.get_validators(request)
+        if validators is None:
+            return
+        parts, last_modified = validators
+        viewer_id = request.user.pk
+        viewer_version = viewer_state.version(viewer_id) if viewer_id is not None else None
+        seed = repr((parts, viewer_id, viewer_version, request.get_full_path()))
+        etag = quote_etag(hashlib.md5(seed.encode(), usedforsecurity=False).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        self.validators = (etag, timestamp)
+        if get_conditional_response(request._request, etag=etag, last_modified=timestamp) is not None:
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.validators and response.status_code in (200, 304):
+            etag, timestamp = self.validators
+            response.headers.setdefault('ETag', etag)
+            if timestamp is not None:
+                response.headers.setdefault('Last-Modified', http_date(timestamp))
+        return response
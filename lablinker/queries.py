@@ -0,0 +1,17 @@
+from django.db.models import IntegerField, Subquery
+
+
+class SubqueryCount(Subquery):
+    """
+    Correlated `COUNT(*)` over a queryset, e.g.
+    `SubqueryCount(Like.objects.filter(post=OuterRef('pk')))`.
+
+    Unlike several `Count()` annotations on different relations, this does not
+    multiply joins together, so each counter stays a single index lookup.
+    """
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) _count)'
+    output_field = IntegerField()
+
+    def __init__(self, queryset, **kwargs):
+        # Model default ordering is meaningless inside COUNT(*)
+        super().__init__(queryset.order_by(), **kwargs)
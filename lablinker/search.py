@@ -0,0 +1,251 @@
+"""
+Database-native full-text indexes.
+
+SQLite gets an external-content FTS5 table kept in sync by triggers on the
+source table; PostgreSQL gets a generated `tsvector` column with a GIN index.
+Either way every insert/update/delete updates the index incrementally inside
+the same transaction, and queries are ranked (bm25 / ts_rank) with
+highlighted snippets. Other databases fall back to icontains filters,
+unranked and without highlights.
+
+Snippets are HTML: the matched text is HTML-escaped and only the
+highlighting is markup.
+"""
+import html
+import re
+from collections import namedtuple
+from functools import reduce
+from operator import and_, or_
+
+from django.apps import apps
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils.module_loading import autodiscover_modules
+from rest_framework.filters import BaseFilterBackend
+
+SearchHit = namedtuple('SearchHit', ['pk', 'rank', 'snippet'])
+
+# name -> FullTextIndex, filled by each app's search.py (see autodiscover())
+registry = {}
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+# What the database wraps matches in; swapped for the tags once the snippet is escaped
+SENTINEL_START = '\ue000'
+SENTINEL_END = '\ue001'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def highlight(snippet):
+    """ Escape a database snippet and turn its sentinels into highlight tags """
+    return (
+        html.escape(snippet or '')
+        .replace(SENTINEL_START, HIGHLIGHT_START)
+        .replace(SENTINEL_END, HIGHLIGHT_END)
+    )
+
+
+def autodiscover():
+    """ Import every installed app's search.py so its indexes are registered """
+    autodiscover_modules('search')
+    return registry
+
+
+class FullTextIndex:
+    def __init__(self, name, table, columns, pk='id', config='english'):
+        self.name = name
+        self.table = table
+        self.columns = list(columns)
+        self.pk = pk
+        self.config = config
+        registry[name] = self
+
+    @property
+    def model(self):
+        return next(model for model in apps.get_models() if model._meta.db_table == self.table)
+
+    @property
+    def fts_table(self):
+        return f'{self.table}_fts'
+
+    @property
+    def vector_column(self):
+        return 'search_vector'
+
+    # Schema -----------------------------------------------------------------
+
+    def install_sql(self, vendor):
+        if vendor == 'sqlite':
+            columns = ', '.join(self.columns)
+            new_values = ', '.join(f'new.{column}' for column in self.columns)
+            old_values = ', '.join(f'old.{column}' for column in self.columns)
+            fts = self.fts_table
+            return [
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='{self.table}', "
+                f"content_rowid='{self.pk}', tokenize='porter unicode61')",
+                f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {self.table} BEGIN "
+                f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.{self.pk}, {new_values}); END",
+                f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {self.table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.{self.pk}, {old_values}); END",
+                f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {columns} ON {self.table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.{self.pk}, {old_values}); "
+                f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.{self.pk}, {new_values}); END",
+                f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+            ]
+        if vendor == 'postgresql':
+            document = " || ' ' || ".join(f"coalesce({column}, '')" for column in self.columns)
+            return [
+                f"ALTER TABLE {self.table} ADD COLUMN {self.vector_column} tsvector "
+                f"GENERATED ALWAYS AS (to_tsvector('{self.config}', {document})) STORED",
+                f"CREATE INDEX {self.table}_search_idx ON {self.table} USING GIN ({self.vector_column})",
+            ]
+        return []
+
+    def uninstall_sql(self, vendor):
+        if vendor == 'sqlite':
+            fts = self.fts_table
+            return [
+                f"DROP TRIGGER IF EXISTS {fts}_ai",
+                f"DROP TRIGGER IF EXISTS {fts}_ad",
+                f"DROP TRIGGER IF EXISTS {fts}_au",
+                f"DROP TABLE IF EXISTS {fts}",
+            ]
+        if vendor == 'postgresql':
+            return [
+                f"DROP INDEX IF EXISTS {self.table}_search_idx",
+                f"ALTER TABLE {self.table} DROP COLUMN IF EXISTS {self.vector_column}",
+            ]
+        return []
+
+    def install(self, apps, schema_editor):
+        """ RunPython forwards hook """
+        for statement in self.install_sql(schema_editor.connection.vendor):
+            schema_editor.execute(statement)
+
+    def uninstall(self, apps, schema_editor):
+        """ RunPython backwards hook """
+        for statement in self.uninstall_sql(schema_editor.connection.vendor):
+            schema_editor.execute(statement)
+
+    def rebuild(self):
+        """
+        Rebuild the whole index from the source table.
+
+        On SQLite the FTS table and triggers are recreated as well, since a
+        migration that remakes the source table silently drops its triggers.
+        """
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                for statement in self.uninstall_sql('sqlite') + self.install_sql('sqlite'):
+                    cursor.execute(statement)
+                cursor.execute(f"INSERT INTO {self.fts_table}({self.fts_table}) VALUES ('optimize')")
+            elif connection.vendor == 'postgresql':
+                cursor.execute(f"REINDEX INDEX {self.table}_search_idx")
+
+    # Queries ----------------------------------------------------------------
+
+    def search(self, query, restrict=None, limit=20, offset=0, prefix=False, snippets=True):
+        """
+        Return SearchHits for `query`, best match first.
+
+        `restrict` is an optional queryset over the source model; only its
+        rows are searched, which is how callers combine text search with
+        ordinary filters in one statement. Snippets are escaped HTML with
+        the matches wrapped in <mark>; with `snippets=False` they are None
+        and the database does not build them.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            return self._search_fallback(tokens, restrict, limit, offset, snippets)
+
+        restrict_sql, restrict_params = None, []
+        if restrict is not None:
+            restrict_sql, restrict_params = restrict.values('pk').query.sql_with_params()
+
+        search = self._search_sqlite if connection.vendor == 'sqlite' else self._search_postgresql
+        return search(tokens, restrict_sql, list(restrict_params), limit, offset, prefix, snippets)
+
+    def _search_sqlite(self, tokens, restrict_sql, restrict_params, limit, offset, prefix, snippets):
+        suffix = '*' if prefix else ''
+        match = ' '.join(f'"{token}"{suffix}' for token in tokens)
+        fts = self.fts_table
+        snippet = f"snippet({fts}, -1, %s, %s, '…', 16)" if snippets else 'NULL'
+        sql = (
+            f"SELECT rowid, -bm25({fts}), {snippet} "
+            f"FROM {fts} WHERE {fts} MATCH %s "
+            f"{f'AND rowid IN ({restrict_sql}) ' if restrict_sql else ''}"
+            f"ORDER BY bm25({fts}) LIMIT %s OFFSET %s"
+        )
+        params = [*([SENTINEL_START, SENTINEL_END] if snippets else []), match, *restrict_params, limit, offset]
+        return self._fetch_hits(sql, params, snippets)
+
+    def _search_postgresql(self, tokens, restrict_sql, restrict_params, limit, offset, prefix, snippets):
+        suffix = ':*' if prefix else ''
+        tsquery = ' & '.join(f"'{token}'{suffix}" for token in tokens)
+        document = " || ' ' || ".join(f"coalesce({column}, '')" for column in self.columns)
+        options = f'StartSel={SENTINEL_START}, StopSel={SENTINEL_END}, MaxFragments=2'
+        headline = f"ts_headline('{self.config}', {document}, q, %s)" if snippets else 'NULL'
+        sql = (
+            f"SELECT {self.pk}, ts_rank({self.vector_column}, q), {headline} "
+            f"FROM {self.table}, to_tsquery('{self.config}', %s) q "
+            f"WHERE {self.vector_column} @@ q "
+            f"{f'AND {self.pk} IN ({restrict_sql}) ' if restrict_sql else ''}"
+            f"ORDER BY 2 DESC, {self.pk} DESC LIMIT %s OFFSET %s"
+        )
+        params = [*([options] if snippets else []), tsquery, *restrict_params, limit, offset]
+        return self._fetch_hits(sql, params, snippets)
+
+    def _fetch_hits(self, sql, params, snippets):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [
+                SearchHit(pk, rank, highlight(snippet) if snippets else None)
+                for pk, rank, snippet in cursor.fetchall()
+            ]
+
+    def _search_fallback(self, tokens, restrict, limit, offset, snippets):
+        """ Every token in some column, newest first; no ranking or highlights """
+        queryset = restrict if restrict is not None else self.model._default_manager.all()
+        condition = reduce(and_, (
+            reduce(or_, (Q(**{f'{column}__icontains': token}) for column in self.columns)) for token in tokens
+        ))
+        pks = queryset.filter(condition).order_by('-pk').values_list('pk', flat=True)[offset:offset + limit]
+        return [SearchHit(pk, 0, '' if snippets else None) for pk in pks]
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    `?search=` through the view's `search_index` instead of LIKE scans.
+
+    Every term is prefix-matched, so it works as-you-type. Only rows of the
+    queryset filtered so far are searched, and the best `search_max_results`
+    matches come back best first. When there were more, `view.search_truncated`
+    is set for the view to tell the client. Place it after OrderingFilter:
+    relevance replaces any other ordering while searching.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        max_results = getattr(view, 'search_max_results', 100)
+        # One extra hit tells whether the results were cut off; snippets would go unused
+        hits = view.search_index.search(
+            query, restrict=queryset.order_by(), limit=max_results + 1, prefix=True, snippets=False,
+        )
+        view.search_truncated = len(hits) > max_results
+        hits = hits[:max_results]
+        if not hits:
+            return queryset.none()
+        relevance = Case(
+            *(When(pk=hit.pk, then=Value(position)) for position, hit in enumerate(hits)),
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=[hit.pk for hit in hits]).order_by(relevance)
@@ -64,6 +64,7 @@ INSTALLED_APPS = [
     'likes',
     'comments',
     'resources',
+    'mediastore',
 ]
 
 MIDDLEWARE = [
@@ -118,6 +119,68 @@ DATABASES = {
 #     }
 # }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory is per process; point CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached
+# when running several workers so invalidation reaches all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'lablinker'),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 300)),
+    }
+}
+
+# Seconds version stamps behind ETags and cached posts live on a per-process cache (see
+# lablinker/conditional.py): how long a worker may miss another worker's change. Shared caches
+# keep them until bumped.
+CONDITIONAL_VERSION_TIMEOUT = int(os.getenv('CONDITIONAL_VERSION_TIMEOUT', 30))
+
+# Seconds a serialized post stays cached (see posts/cache.py); edits, likes, comments,
+# bookmarks and uploads invalidate it sooner, author profile changes only on expiry
+POST_CACHE_TIMEOUT = int(os.getenv('POST_CACHE_TIMEOUT', 300))
+
+# Seconds each user's liked/bookmarked post ids stay cached (0 disables; see lablinker/viewer_state.py).
+# Users with more than VIEWER_STATE_CACHE_MAX_IDS are resolved page by page instead.
+VIEWER_STATE_CACHE_TIMEOUT = int(os.getenv('VIEWER_STATE_CACHE_TIMEOUT', 300))
+VIEWER_STATE_CACHE_MAX_IDS = int(os.getenv('VIEWER_STATE_CACHE_MAX_IDS', 5000))
+
+# Replies inlined under each comment of a page; the rest are paged from /comments/<id>/replies/
+COMMENT_REPLY_PREVIEW = int(os.getenv('COMMENT_REPLY_PREVIEW', 3))
+
+# Seconds the user directory's profession/country facet counts stay cached (see user/directory.py);
+# user edits drop them sooner. NDJSON exports read users this many rows at a time.
+USER_DIRECTORY_FACETS_TIMEOUT = int(os.getenv('USER_DIRECTORY_FACETS_TIMEOUT', 60))
+USER_EXPORT_CHUNK_SIZE = int(os.getenv('USER_EXPORT_CHUNK_SIZE', 2000))
+# Users one call to /users/batch/ may ask for
+USER_BATCH_MAX_IDS = int(os.getenv('USER_BATCH_MAX_IDS', 100))
+
+# "People you may know" (see auth_app/graph.py): friend-of-friend mutual counts, boosted by
+# these fractions when the candidate shares the user's profession / country
+SUGGESTION_PROFESSION_WEIGHT = float(os.getenv('SUGGESTION_PROFESSION_WEIGHT', 0.5))
+SUGGESTION_COUNTRY_WEIGHT = float(os.getenv('SUGGESTION_COUNTRY_WEIGHT', 0.25))
+# Suggestions stored per user by `precompute_suggestions`
+SUGGESTIONS_TOP_N = int(os.getenv('SUGGESTIONS_TOP_N', 50))
+# Seconds before a process refreshes its in-memory follow graph snapshot
+FOLLOW_GRAPH_MAX_AGE = int(os.getenv('FOLLOW_GRAPH_MAX_AGE', 300))
+
+# One-time login codes (see auth_app/otp.py): 'database' or 'cache' (only with a cache shared by
+# all workers, such as Redis or Memcached); lifetime in seconds, guesses allowed per code, and
+# how often expired rows are purged in 'database' mode
+OTP_STORE = os.getenv('OTP_STORE', 'database')
+OTP_TTL = int(os.getenv('OTP_TTL', 300))
+OTP_MAX_ATTEMPTS = int(os.getenv('OTP_MAX_ATTEMPTS', 5))
+OTP_PURGE_INTERVAL = int(os.getenv('OTP_PURGE_INTERVAL', 3600))
+
+# Password hashing for login/signup/reset (see auth_app/hashing.py): processes hashing, hashes
+# allowed queued or running at once, and seconds a request waits for a slot before a 503.
+# PASSWORD_HASHING_OFFLOAD=False hashes on the request thread instead.
+PASSWORD_HASHING_OFFLOAD = os.getenv('PASSWORD_HASHING_OFFLOAD', 'True') == 'True'
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', 2))
+PASSWORD_HASHING_MAX_PENDING = int(os.getenv('PASSWORD_HASHING_MAX_PENDING', 16))
+PASSWORD_HASHING_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASHING_QUEUE_TIMEOUT', 5))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -163,7 +226,7 @@ AUTH_USER_MODEL = 'auth_app.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'auth_app.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -174,6 +237,10 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
 }
+# Verified access tokens remembered per process, and seconds an authenticated user stays
+# cached (see auth_app/authentication.py)
+JWT_TOKEN_CACHE_SIZE = int(os.getenv('JWT_TOKEN_CACHE_SIZE', 10000))
+JWT_USER_CACHE_TIMEOUT = int(os.getenv('JWT_USER_CACHE_TIMEOUT', 60))
 
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
@@ -182,6 +249,18 @@ EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL') == 'True'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 FROM_EMAIL = os.getenv('FROM_EMAIL', '')
+# Where django.core.mail.backends.filebased.EmailBackend writes messages, for offline runs
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'sent_emails'))
+
+# Email outbox (see auth_app/outbox.py): messages sent per SMTP connection round, delivery
+# attempts before a message is marked failed, and seconds before the first retry (doubles after)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 100))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_RETRY_BACKOFF = float(os.getenv('EMAIL_OUTBOX_RETRY_BACKOFF', 30))
+# Seconds a worker holds claimed messages; a worker that dies mid-batch releases them after this
+EMAIL_OUTBOX_LEASE = int(os.getenv('EMAIL_OUTBOX_LEASE', 300))
+# Seconds sent and failed messages are kept before `drain_outbox` deletes them
+EMAIL_OUTBOX_RETENTION = int(os.getenv('EMAIL_OUTBOX_RETENTION', 7 * 24 * 3600))
 
 
 STATIC_URL = '/static/'
@@ -189,4 +268,77 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 # Media files settings
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Uploads (PostFile.file, CustomUser.avatar) go through STORAGES['media'].
+# Both backends store each distinct file once, keyed by its SHA-256 (see mediastore/storage.py).
+MEDIA_STORAGE_BACKEND = os.getenv(
+    'MEDIA_STORAGE_BACKEND',
+    'mediastore.storage.CloudinaryContentStorage' if os.getenv('CLOUDINARY_CLOUD_NAME')
+    else 'mediastore.storage.LocalContentStorage'
+)
+
+# Post uploads are spooled here and pushed to the media storage by the 'uploads' pool (see posts/uploads.py)
+MEDIA_SPOOL_ROOT = os.getenv('MEDIA_SPOOL_ROOT', os.path.join(BASE_DIR, 'spool'))
+MEDIA_UPLOAD_MAX_ATTEMPTS = int(os.getenv('MEDIA_UPLOAD_MAX_ATTEMPTS', 3))
+# Seconds before the first retry; doubles on every further attempt
+MEDIA_UPLOAD_RETRY_BACKOFF = float(os.getenv('MEDIA_UPLOAD_RETRY_BACKOFF', 2))
+
+# Derivatives rendered for every uploaded image (max width per label), as WebP and JPEG
+MEDIA_RENDITION_WIDTHS = {
+    'thumb': 320,
+    'medium': 960,
+    'full': 2048,
+}
+MEDIA_RENDITION_QUALITY = int(os.getenv('MEDIA_RENDITION_QUALITY', 80))
+# Processes rendering derivatives (see mediastore/renditions.py)
+MEDIA_DERIVATIVE_WORKERS = int(os.getenv('MEDIA_DERIVATIVE_WORKERS', 2))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'media': {
+        'BACKEND': MEDIA_STORAGE_BACKEND,
+    },
+}
+
+# Background tasks (see lablinker/background.py)
+BACKGROUND_TASK_WORKERS = int(os.getenv('BACKGROUND_TASK_WORKERS', 4))
+# Dedicated pools, so slow work of one kind cannot starve the others
+BACKGROUND_TASK_POOLS = {
+    'uploads': int(os.getenv('MEDIA_UPLOAD_WORKERS', 4)),
+    # One drainer per process is enough; it reuses its SMTP connection across messages
+    'mail': 1,
+    'previews': int(os.getenv('RESOURCE_PREVIEW_WORKERS', 2)),
+}
+# Run tasks inline instead of on the worker pool; handy for tests and one-off scripts
+BACKGROUND_TASKS_EAGER = os.getenv('BACKGROUND_TASKS_EAGER') == 'True'
+
+# Link previews of resources (see resources/previews.py): pages fetched at once per unfurl
+# batch, seconds per connect/read, bytes read per page, and seconds before a preview is refetched
+RESOURCE_PREVIEW_TRANSPORT = os.getenv('RESOURCE_PREVIEW_TRANSPORT', 'resources.previews.Urllib3Transport')
+RESOURCE_PREVIEW_CONCURRENCY = int(os.getenv('RESOURCE_PREVIEW_CONCURRENCY', 8))
+RESOURCE_PREVIEW_TIMEOUT = float(os.getenv('RESOURCE_PREVIEW_TIMEOUT', 5))
+RESOURCE_PREVIEW_MAX_BYTES = int(os.getenv('RESOURCE_PREVIEW_MAX_BYTES', 512 * 1024))
+RESOURCE_PREVIEW_TTL = int(os.getenv('RESOURCE_PREVIEW_TTL', 24 * 3600))
+# Lets previews be fetched from private and loopback addresses; never enable with untrusted users
+RESOURCE_PREVIEW_ALLOW_PRIVATE = os.getenv('RESOURCE_PREVIEW_ALLOW_PRIVATE') == 'True'
+
+# Dead-link checks of resources, run by `check_resource_links` from cron (see resources/linkcheck.py):
+# seconds before a link is checked again, probes in flight overall and per host, and URLs per
+# asyncio batch
+LINK_CHECK_INTERVAL = int(os.getenv('LINK_CHECK_INTERVAL', 24 * 3600))
+LINK_CHECK_CONCURRENCY = int(os.getenv('LINK_CHECK_CONCURRENCY', 64))
+LINK_CHECK_PER_HOST = int(os.getenv('LINK_CHECK_PER_HOST', 4))
+LINK_CHECK_BATCH_SIZE = int(os.getenv('LINK_CHECK_BATCH_SIZE', 2000))
+
+# Home timeline (see posts/timeline.py)
+# Posts kept per user in the materialized timeline
+FEED_TIMELINE_MAX_ENTRIES = int(os.getenv('FEED_TIMELINE_MAX_ENTRIES', 800))
+# Authors with at least this many followers are merged in at read time instead of fanned out
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 10000))
+FEED_FANOUT_BATCH_SIZE = int(os.getenv('FEED_FANOUT_BATCH_SIZE', 1000))
@@ -0,0 +1,124 @@
+"""
+Per-request answers to "has the viewer liked / bookmarked / followed these?".
+
+Serializers ask the request's ViewerState instead of querying per row.
+List serializers prime it with every post and user id on the page, one
+set query per relation. Each user's liked and bookmarked post ids can
+also be cached whole (VIEWER_STATE_CACHE_TIMEOUT); toggles invalidate
+them, and bump a per-user version that conditional GETs include in
+their ETags.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from lablinker import conditional
+
+# relation: (model, viewer field, target field)
+RELATIONS = {
+    'liked': ('likes.Like', 'user_id', 'post_id'),
+    'bookmarked': ('posts.Bookmark', 'user_id', 'post_id'),
+    'following': ('auth_app.Follow', 'follower_id', 'following_id'),
+}
+CACHED_RELATIONS = ('liked', 'bookmarked')
+
+
+def _set_key(relation, user_id):
+    return f'viewer-state:{user_id}:{relation}'
+
+
+def _version_key(user_id):
+    return f'viewer-state:{user_id}:version'
+
+
+def version(user_id):
+    """ Changes whenever `user_id` likes, bookmarks or follows something """
+    return conditional.get_version(_version_key(user_id))
+
+
+def invalidate(relation, user_id):
+    def clear():
+        cache.delete(_set_key(relation, user_id))
+        conditional.bump_version(_version_key(user_id))
+    transaction.on_commit(clear)
+
+
+class ViewerState:
+
+    def __init__(self, viewer):
+        self.viewer_id = viewer.pk if viewer is not None and viewer.is_authenticated else None
+        self._looked_up = {relation: set() for relation in RELATIONS}
+        self._found = {relation: set() for relation in RELATIONS}
+        self._cached = {}
+
+    @classmethod
+    def for_request(cls, request):
+        """ The request's shared ViewerState """
+        if request is None:
+            return cls(None)
+        state = getattr(request, '_viewer_state', None)
+        if state is None:
+            state = request._viewer_state = cls(getattr(request, 'user', None))
+        return state
+
+    def _cached_ids(self, relation):
+        """ Every target id of `relation` from the per-user cache, or None when not cached """
+        timeout = settings.VIEWER_STATE_CACHE_TIMEOUT
+        if relation not in CACHED_RELATIONS or not timeout:
+            return None
+        if relation not in self._cached:
+            key = _set_key(relation, self.viewer_id)
+            ids = cache.get(key)
+            if ids is None:
+                model, viewer_field, target_field = RELATIONS[relation]
+                limit = settings.VIEWER_STATE_CACHE_MAX_IDS
+                rows = list(
+                    apps.get_model(model).objects.filter(**{viewer_field: self.viewer_id})
+                    .order_by().values_list(target_field, flat=True)[:limit + 1]
+                )
+                # Heavy users are resolved per page instead; False marks them
+                ids = frozenset(rows) if len(rows) <= limit else False
+                cache.set(key, ids, timeout)
+            # An empty set is a perfectly good answer; only the heavy-user marker is not
+            self._cached[relation] = None if ids is False else ids
+        return self._cached[relation]
+
+    def prime(self, relation, ids):
+        """ Resolve `relation` for all of `ids` in one query """
+        if self.viewer_id is None or self._cached_ids(relation) is not None:
+            return
+        missing = set(ids) - self._looked_up[relation]
+        if not missing:
+            return
+        model, viewer_field, target_field = RELATIONS[relation]
+        self._found[relation].update(
+            apps.get_model(model).objects
+            .filter(**{viewer_field: self.viewer_id, f'{target_field}__in': missing})
+            .order_by().values_list(target_field, flat=True)
+        )
+        self._looked_up[relation].update(missing)
+
+    def has(self, relation, target_id):
+        if self.viewer_id is None:
+            return False
+        cached = self._cached_ids(relation)
+        if cached is not None:
+            return target_id in cached
+        self.prime(relation, [target_id])
+        return target_id in self._found[relation]
+
+    def prime_posts(self, posts):
+        post_ids = [post.id for post in posts]
+        self.prime('liked', post_ids)
+        self.prime('bookmarked', post_ids)
+        self.prime('following', [post.author_id for post in posts])
+
+    def is_liked(self, post_id):
+        return self.has('liked', post_id)
+
+    def is_bookmarked(self, post_id):
+        return self.has('bookmarked', post_id)
+
+    def is_following(self, user_id):
+        return self.has('following', user_id)
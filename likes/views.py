@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models import F
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -15,9 +17,16 @@ class LikeToggleView(APIView):
         except Post.DoesNotExist:
             return Response({"detail": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(user=request.user, post=post)
+            if not created:
+                # A concurrent unlike may have removed the row already; only one of us decrements
+                if Like.objects.filter(id=like.id).delete()[0]:
+                    Post.objects.filter(id=post.id).update(like_count=F('like_count') - 1)
+            else:
+                Post.objects.filter(id=post.id).update(like_count=F('like_count') + 1)
+
         if not created:
-            like.delete()
             return Response({"message": "Post unliked."}, status=status.HTTP_200_OK)
 
         return Response({"message": "Post liked."}, status=status.HTTP_201_CREATED)
@@ -0,0 +1,84 @@
+"""
+Image derivative rendering.
+
+Kept free of Django imports: it runs inside a process pool (see
+mediastore/renditions.py) and only needs Pillow.
+"""
+import io
+import os
+import tempfile
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+FORMATS = (
+    ('webp', 'WEBP'),
+    ('jpeg', 'JPEG'),
+)
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def _write(image, path, image_format, quality):
+    if os.path.exists(path):
+        return  # Same source digest, same spec: already rendered
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.render-')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            # No exif= / icc_profile= arguments: the written file carries no metadata
+            if image_format == 'JPEG':
+                image.save(handle, 'JPEG', quality=quality, optimize=True, progressive=True)
+            else:
+                image.save(handle, 'WEBP', quality=quality, method=4)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _flatten(image):
+    """ JPEG has no alpha channel: composite onto white """
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render(data, digest, media_root, widths, quality=80):
+    """
+    Render `data` at each of `widths` ({label: max width}) as WebP and JPEG
+    under `<media_root>/derivatives/<digest>/`, never upscaling.
+
+    Returns {label: {'width', 'height', 'webp', 'jpeg'}} with names relative to
+    media_root, or {} if `data` is not an image Pillow can read.
+    """
+    try:
+        source = Image.open(io.BytesIO(data))
+        source.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return {}
+
+    with source:
+        # Apply the EXIF orientation before the metadata is dropped
+        oriented = ImageOps.exif_transpose(source)
+        has_alpha = oriented.mode in ('RGBA', 'LA') or 'transparency' in oriented.info
+        webp_source = oriented.convert('RGBA' if has_alpha else 'RGB')
+        jpeg_source = _flatten(oriented)
+
+        renditions = {}
+        for label, max_width in sorted(widths.items(), key=lambda item: item[1]):
+            width = min(max_width, oriented.width)
+            height = max(1, round(oriented.height * width / oriented.width))
+            rendition = {'width': width, 'height': height}
+            for key, image_format in FORMATS:
+                image = webp_source if image_format == 'WEBP' else jpeg_source
+                if width < image.width:
+                    image = image.resize((width, height), Image.LANCZOS)
+                name = f'derivatives/{digest[:2]}/{digest}/{label}-{width}.{EXTENSIONS[key]}'
+                _write(image, os.path.join(media_root, name), image_format, quality)
+                rendition[key] = name
+            renditions[label] = rendition
+        return renditions
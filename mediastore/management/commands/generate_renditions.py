@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from mediastore.renditions import update_renditions
+from posts.models import PostFile
+
+
+class Command(BaseCommand):
+    help = "Render image derivatives for post attachments and avatars uploaded before they existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Re-render files that already have derivatives")
+
+    def handle(self, *args, **options):
+        post_files = PostFile.objects.filter(status=PostFile.STATUS_READY).exclude(file='')
+        users = get_user_model().objects.exclude(avatar='').exclude(avatar__isnull=True)
+        if not options['all']:
+            post_files = post_files.filter(renditions={})
+            users = users.filter(avatar_renditions={})
+
+        rendered = 0
+        for queryset, field_name, renditions_field in (
+            (post_files, 'file', 'renditions'),
+            (users, 'avatar', 'avatar_renditions'),
+        ):
+            for instance in queryset.iterator():
+                try:
+                    if update_renditions(instance, field_name, renditions_field):
+                        rendered += 1
+                except Exception as exc:
+                    self.stderr.write(f"{instance._meta.label} {instance.pk}: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered derivatives for {rendered} files."))
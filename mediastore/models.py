@@ -0,0 +1,13 @@
+from django.db import models
+
+
+class Blob(models.Model):
+    """ One stored copy of a file, shared by every field that uploaded the same bytes """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)  # Name inside the storage backend
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
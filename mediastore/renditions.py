@@ -0,0 +1,101 @@
+"""
+Responsive derivatives (thumbnail/medium/full, WebP + JPEG) of uploaded images.
+
+Rendering is CPU-bound, so it runs in a bounded process pool rather than on
+request or upload threads. Files are cached on the default (local) storage,
+named after the SHA-256 of the source, so identical uploads share them.
+"""
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import storages
+
+from . import imaging
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the parent runs request and background threads
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.MEDIA_DERIVATIVE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def render_renditions(data):
+    """ Render derivatives of the image bytes `data`; {} for anything that is not an image """
+    args = (
+        data,
+        hashlib.sha256(data).hexdigest(),
+        str(settings.MEDIA_ROOT),
+        settings.MEDIA_RENDITION_WIDTHS,
+        settings.MEDIA_RENDITION_QUALITY,
+    )
+    if settings.BACKGROUND_TASKS_EAGER:
+        return imaging.render(*args)
+    return get_pool().submit(imaging.render, *args).result()
+
+
+def wants_originals(request):
+    """ Originals are only served when a client asks with ?include_originals=true """
+    return bool(request) and request.query_params.get('include_originals') in ('1', 'true', 'True')
+
+
+def _absolute(url, request):
+    return request.build_absolute_uri(url) if request else url
+
+
+def rendition_urls(renditions, request=None):
+    """ {label: {'width', 'height', 'webp', 'jpeg'}} with names turned into URLs """
+    storage = storages['default']
+    return {
+        label: {
+            'width': rendition['width'],
+            'height': rendition['height'],
+            'webp': _absolute(storage.url(rendition['webp']), request),
+            'jpeg': _absolute(storage.url(rendition['jpeg']), request),
+        }
+        for label, rendition in (renditions or {}).items()
+    }
+
+
+def preferred_url(field_file, renditions, label, request=None):
+    """ URL of the `label` JPEG rendition, falling back to the original for non-images """
+    if renditions and label in renditions:
+        return _absolute(storages['default'].url(renditions[label]['jpeg']), request)
+    if field_file:
+        return _absolute(field_file.url, request)
+    return None
+
+
+def update_renditions(instance, field_name, renditions_field):
+    """ Render the file in `instance.<field_name>` and store the map in `instance.<renditions_field>` """
+    field_file = getattr(instance, field_name)
+    renditions = {}
+    if field_file:
+        with field_file.open('rb') as handle:
+            renditions = render_renditions(handle.read())
+    # Skip the write if the file was replaced while we were rendering
+    type(instance)._default_manager.filter(pk=instance.pk, **{field_name: field_file.name or ''}).update(
+        **{renditions_field: renditions}
+    )
+    setattr(instance, renditions_field, renditions)
+    return renditions
+
+
+def render_instance_renditions(model_label, pk, field_name, renditions_field):
+    """ Background-task entry point for update_renditions() """
+    model = apps.get_model(model_label)
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is not None:
+        update_renditions(instance, field_name, renditions_field)
@@ -0,0 +1,66 @@
+"""
+Release content-addressed blobs when the fields pointing at them go away.
+
+Django never deletes files on its own, so for every FileField backed by a
+ContentAddressedMixin storage we drop a reference when the row is deleted
+(including cascades) or when the field is saved with a newly stored file,
+even one with the same bytes (and so the same name) as before.
+"""
+from functools import lru_cache
+
+from django.apps import apps
+from django.db.models import FileField
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .storage import ContentAddressedMixin
+
+
+@lru_cache(maxsize=None)
+def managed_fields(model):
+    return tuple(
+        field for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedMixin)
+    )
+
+
+def _file_name(value):
+    return getattr(value, 'name', value) or None
+
+
+def remember_files(sender, instance, **kwargs):
+    # Rows loaded from the database carry plain names; freshly assigned uploads are not stored yet
+    instance._stored_file_names = {
+        field.attname: instance.__dict__[field.attname] or None
+        for field in managed_fields(sender)
+        if isinstance(instance.__dict__.get(field.attname), str)
+    }
+
+
+def release_replaced_files(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_file_names', {})
+    for field in managed_fields(sender):
+        current = _file_name(getattr(instance, field.attname))
+        previous = stored.get(field.attname)
+        new_reference = getattr(current, 'new_reference', False)
+        if previous and (previous != current or new_reference):
+            field.storage.delete(previous)
+        if new_reference:
+            # Released once; saving the instance again must not release it again
+            current.new_reference = False
+        stored[field.attname] = current
+    instance._stored_file_names = stored
+
+
+def release_deleted_files(sender, instance, **kwargs):
+    for field in managed_fields(sender):
+        name = _file_name(instance.__dict__.get(field.attname))
+        if name:
+            field.storage.delete(name)
+
+
+def connect_file_fields():
+    for model in apps.get_models():
+        if managed_fields(model):
+            post_init.connect(remember_files, sender=model, weak=False)
+            post_save.connect(release_replaced_files, sender=model, weak=False)
+            post_delete.connect(release_deleted_files, sender=model, weak=False)
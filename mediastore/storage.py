@@ -0,0 +1,157 @@
+import hashlib
+import os
+import re
+import tempfile
+from urllib.request import urlopen
+
+import cloudinary
+import cloudinary.uploader
+from cloudinary.models import CLOUDINARY_FIELD_DB_RE
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage, storages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Blob
+
+
+def media_storage():
+    """ Storage backend for user uploads, selected by STORAGES['media'] in settings """
+    return storages['media']
+
+
+class StoredName(str):
+    """
+    The name `_save` returns. It flags that a new reference was taken, so
+    that re-saving a field with identical bytes (same name as before) still
+    releases the reference the field held until then.
+    """
+    new_reference = True
+
+
+class ContentAddressedMixin:
+    """
+    Stores each distinct upload once, named after the SHA-256 of its bytes.
+
+    A Blob row per digest counts the fields referencing it: saving an
+    identical file only bumps the count, and the bytes are removed when the
+    last reference is deleted. Backends implement `_store_blob(name, content)`
+    (returning the stored name) and `_remove_blob(name)`.
+    """
+
+    def blob_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        return f'blobs/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content hash in _save()
+        return name
+
+    def _save(self, name, content):
+        sha256 = hashlib.sha256()
+        size = 0
+        for chunk in content.chunks():
+            sha256.update(chunk)
+            size += len(chunk)
+        digest = sha256.hexdigest()
+
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(sha256=digest).first()
+            if blob is None:
+                stored = self._store_blob(self.blob_name(digest, name), content)
+                try:
+                    with transaction.atomic():
+                        Blob.objects.create(sha256=digest, name=stored, size=size, refcount=1)
+                    return StoredName(stored)
+                except IntegrityError:
+                    pass  # The same bytes were stored concurrently; share that blob
+            Blob.objects.filter(sha256=digest).update(refcount=F('refcount') + 1)
+            return StoredName(Blob.objects.values_list('name', flat=True).get(sha256=digest))
+
+    def delete(self, name):
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.refcount > 1:
+                Blob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            transaction.on_commit(lambda: self._remove_unreferenced(name))
+
+    def _remove_unreferenced(self, name):
+        # An identical upload may have re-created the blob since it was released
+        if not Blob.objects.filter(name=name).exists():
+            self._remove_blob(name)
+
+
+class LocalContentStorage(ContentAddressedMixin, FileSystemStorage):
+    """ Content-addressed blobs under MEDIA_ROOT, served from MEDIA_URL """
+
+    def _store_blob(self, name, content):
+        if self.exists(name):
+            return name
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file and rename, so readers never see a partial blob
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                for chunk in content.chunks():
+                    handle.write(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def _remove_blob(self, name):
+        FileSystemStorage.delete(self, name)
+
+
+class CloudinaryContentStorage(ContentAddressedMixin, Storage):
+    """
+    Content-addressed blobs on Cloudinary.
+
+    Names use the same `<resource_type>/<type>/v<version>/<public_id>.<format>`
+    format CloudinaryField stored, so files uploaded before the storage
+    abstraction keep resolving.
+    """
+
+    def _resource(self, name):
+        match = re.match(CLOUDINARY_FIELD_DB_RE, name)
+        return cloudinary.CloudinaryResource(
+            match.group('public_id'),
+            format=match.group('format'),
+            version=match.group('version'),
+            type=match.group('type') or 'upload',
+            resource_type=match.group('resource_type') or 'image',
+        )
+
+    def _store_blob(self, name, content):
+        content.seek(0)
+        resource = cloudinary.uploader.upload_resource(
+            content,
+            public_id=os.path.splitext(name)[0],
+            resource_type='auto',
+            overwrite=False,
+        )
+        return resource.get_prep_value()
+
+    def _remove_blob(self, name):
+        resource = self._resource(name)
+        cloudinary.uploader.destroy(resource.public_id, resource_type=resource.resource_type, type=resource.type)
+
+    def _open(self, name, mode='rb'):
+        with urlopen(self.url(name)) as response:
+            return ContentFile(response.read(), name=name)
+
+    def exists(self, name):
+        return Blob.objects.filter(name=name).exists()
+
+    def size(self, name):
+        return Blob.objects.values_list('size', flat=True).get(name=name)
+
+    def url(self, name):
+        return self._resource(name).build_url(secure=True)
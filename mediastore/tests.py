@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from posts.models import Post, PostFile
+from .models import Blob
+
+
+class ContentAddressedStorageTestCase(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            username='uploader', email='uploader@example.com', password='testpassword123'
+        )
+        self.post = Post.objects.create(author=self.user, content='gel images')
+
+    def upload(self, data, name='sars2cov.jpg'):
+        post_file = PostFile(post=self.post)
+        post_file.file.save(name, ContentFile(data), save=True)
+        return post_file
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.upload(b'same bytes')
+        second = self.upload(b'same bytes', name='sars2cov_copy.jpg')
+        other = self.upload(b'other bytes')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertTrue(first.file.name.startswith('blobs/'))
+        self.assertEqual(Blob.objects.get(name=first.file.name).refcount, 2)
+        self.assertEqual(Blob.objects.count(), 2)
+
+    def test_last_reference_removes_the_file(self):
+        first = self.upload(b'same bytes')
+        second = self.upload(b'same bytes')
+        path = os.path.join(self.media_root, first.file.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(Blob.objects.get(name=second.file.name).refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()  # Cascades to the remaining PostFile
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_replacing_avatar_releases_previous_file(self):
+        self.user.avatar.save('me.png', ContentFile(b'old face'))
+        old_name = self.user.avatar.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.avatar.save('me.png', ContentFile(b'new face'))
+
+        self.assertFalse(Blob.objects.filter(name=old_name).exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, old_name)))
+
+    def test_saving_identical_bytes_again_keeps_one_reference(self):
+        self.user.avatar.save('me.png', ContentFile(b'same face'))
+        self.user.avatar.save('me.png', ContentFile(b'same face'))
+        self.user.save()
+        self.assertEqual(Blob.objects.get(name=self.user.avatar.name).refcount, 1)
@@ -0,0 +1,98 @@
+"""
+Versioned cache of serialized posts for PostDetailView.
+
+Entries are keyed by post id and a per-post version stamp. Anything that
+changes what a post serializes to (edits, likes, comments, bookmarks,
+uploads) bumps the version once its transaction commits, so stale entries
+are never read again and simply expire. The cached payload is the same
+for every viewer; viewer-specific fields are overlaid per request. What
+the payload does take from the request (the host in absolute URLs and
+?include_originals) picks a variant, which is part of the key.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from lablinker import conditional
+from mediastore.renditions import wants_originals
+
+HITS_KEY = 'post-cache:hits'
+MISSES_KEY = 'post-cache:misses'
+# Bumped along with every post version, and when anything else in a post listing changes
+COLLECTION_VERSION_KEY = 'post-cache:collection:version'
+CATEGORY_VERSION_KEY = 'post-cache:categories:version'
+
+
+def _version_key(post_id):
+    return f'post-cache:{post_id}:version'
+
+
+def _entry_key(post_id, version, variant):
+    return f'post-cache:{post_id}:v{version}:{variant}'
+
+
+def get_version(post_id):
+    return conditional.get_version(_version_key(post_id))
+
+
+def bump_version(post_id):
+    conditional.bump_version(_version_key(post_id))
+    conditional.bump_version(COLLECTION_VERSION_KEY)
+
+
+def invalidate_on_commit(post_id):
+    """ Bump the post's version after the current transaction commits """
+    transaction.on_commit(lambda: bump_version(post_id))
+
+
+def collection_version():
+    """ Changes whenever any post, or an author shown with posts, changes """
+    return conditional.get_version(COLLECTION_VERSION_KEY)
+
+
+def invalidate_collection_on_commit():
+    transaction.on_commit(lambda: conditional.bump_version(COLLECTION_VERSION_KEY))
+
+
+def category_version():
+    return conditional.get_version(CATEGORY_VERSION_KEY)
+
+
+def invalidate_categories_on_commit():
+    # Posts embed their category, so listings change too
+    transaction.on_commit(lambda: conditional.bump_version(CATEGORY_VERSION_KEY))
+    invalidate_collection_on_commit()
+
+
+def _count(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def request_variant(request):
+    """ The parts of `request` a rendered post depends on """
+    originals = '+originals' if wants_originals(request) else ''
+    return f'{request.scheme}://{request.get_host()}{originals}'
+
+
+def get_or_render(post_id, render, variant):
+    """ Cached payload of `post_id` as rendered for `variant`, calling `render()` on a miss; `render` may raise """
+    key = _entry_key(post_id, get_version(post_id), variant)
+    data = cache.get(key)
+    if data is not None:
+        _count(HITS_KEY)
+        return data
+    _count(MISSES_KEY)
+    data = render()
+    cache.set(key, data, timeout=settings.POST_CACHE_TIMEOUT)
+    return data
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lablinker.search import autodiscover
+
+
+class Command(BaseCommand):
+    help = "Rebuild full-text search indexes from their source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('indexes', nargs='*', help="Index names to rebuild (default: all)")
+
+    def handle(self, *args, **options):
+        registry = autodiscover()
+        names = options['indexes'] or sorted(registry)
+        unknown = [name for name in names if name not in registry]
+        if unknown:
+            raise CommandError(f"Unknown search index: {', '.join(unknown)}. Choose from {', '.join(sorted(registry))}.")
+
+        for name in names:
+            registry[name].rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt search index '{name}'."))
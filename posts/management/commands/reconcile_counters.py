@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Q
+
+from comments.models import Comment
+from lablinker.queries import SubqueryCount
+from likes.models import Like
+from posts.cache import invalidate_on_commit
+from posts.models import Bookmark, Post
+
+COUNTERS = {
+    'like_count': Like,
+    'comment_count': Comment,
+    'bookmark_count': Bookmark,
+}
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized like/comment/bookmark counters on posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help="Number of posts checked per transaction (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        checked = repaired = 0
+
+        while True:
+            ids = list(
+                Post.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            checked += len(ids)
+            repaired += self.reconcile_chunk(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} posts, repaired {repaired}."))
+
+    def reconcile_chunk(self, ids):
+        actual = {
+            f'actual_{field}': SubqueryCount(model.objects.filter(post=OuterRef('pk')).values('id'))
+            for field, model in COUNTERS.items()
+        }
+        drifted = Q()
+        for field in COUNTERS:
+            drifted |= ~Q(**{field: F(f'actual_{field}')})
+
+        with transaction.atomic():
+            posts = list(
+                Post.objects.select_for_update()
+                .filter(id__in=ids)
+                .annotate(**actual)
+                .filter(drifted)
+                .only('id', *COUNTERS)
+            )
+            for post in posts:
+                for field in COUNTERS:
+                    setattr(post, field, getattr(post, f'actual_{field}'))
+                invalidate_on_commit(post.id)
+            Post.objects.bulk_update(posts, list(COUNTERS))
+        return len(posts)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts.uploads import resume_pending_uploads
+
+
+class Command(BaseCommand):
+    help = "Re-queue post attachments still pending after a worker restart"
+
+    def handle(self, *args, **options):
+        count = resume_pending_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Re-queued {count} pending uploads."))
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:38
+
+from django.db import migrations, models
+from django.db.models import OuterRef
+
+from lablinker.queries import SubqueryCount
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Like = apps.get_model('likes', 'Like')
+    Comment = apps.get_model('comments', 'Comment')
+    Bookmark = apps.get_model('posts', 'Bookmark')
+    Post.objects.update(
+        like_count=SubqueryCount(Like.objects.filter(post=OuterRef('pk')).values('id')),
+        comment_count=SubqueryCount(Comment.objects.filter(post=OuterRef('pk')).values('id')),
+        bookmark_count=SubqueryCount(Bookmark.objects.filter(post=OuterRef('pk')).values('id')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_keyset_pagination_indexes'),
+        ('likes', '0001_initial'),
+        ('comments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='bookmark_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_timelines(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    Follow = apps.get_model('auth_app', 'Follow')
+
+    following = {}
+    for follower_id, author_id in Follow.objects.values_list('follower_id', 'following_id').iterator():
+        following.setdefault(follower_id, []).append(author_id)
+
+    for user_id, author_ids in following.items():
+        recent = (
+            Post.objects.filter(author_id__in=author_ids)
+            .order_by('-created_at', '-id')
+            .values_list('id', 'created_at')[:settings.FEED_TIMELINE_MAX_ENTRIES]
+        )
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at) for post_id, created_at in recent],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_engagement_counters'),
+        ('auth_app', '0006_customuser_manager'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_created_idx')],
+                'unique_together': {('user', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:42
+
+from django.db import migrations
+
+from posts.search import post_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_timelineentry'),
+    ]
+
+    operations = [
+        # FTS5 table + triggers on SQLite, generated tsvector column + GIN index on PostgreSQL
+        migrations.RunPython(post_index.install, post_index.uninstall),
+    ]
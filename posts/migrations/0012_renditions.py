@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_postfile_upload_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postfile',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
 from django.conf import settings
 
-from cloudinary.models import CloudinaryField
+from mediastore.storage import media_storage
 
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -17,6 +17,16 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Everything PostSerializer reads, in a fixed number of queries. Viewer
+        state is resolved per page by lablinker.viewer_state, and authors by
+        auth_app.loader.
+        """
+        return self.select_related('category').prefetch_related('tags', 'files')
+
+
 class Post(models.Model):
     content = models.TextField()
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts')
@@ -25,16 +35,47 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized engagement counters. Always change them with F() expressions
+    # inside the transaction that creates/deletes the row; `manage.py
+    # reconcile_counters` repairs any drift.
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    bookmark_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination seeks on (created_at, id), see lablinker.pagination
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='post_category_created_idx'),
+        ]
 
     def __str__(self):
         return f"Post {self.id} by {self.author.email}"
 
 class PostFile(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='files')
-    file = CloudinaryField("image", blank=True, null=True)
+    file = models.FileField(upload_to='post_files/', storage=media_storage, max_length=255, blank=True, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Uploads are spooled to local disk and pushed to storage in the background, see posts/uploads.py
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_READY)
+    original_name = models.CharField(max_length=255, blank=True)
+    spool_path = models.CharField(max_length=500, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # {label: {width, height, webp, jpeg}} derivatives, see mediastore/renditions.py
+    renditions = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"File for Post {self.post.id}"
@@ -47,7 +88,26 @@ class Bookmark(models.Model):
     class Meta:
         unique_together = ('user', 'post')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='bookmark_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} bookmarked Post {self.post.id}"
 
+
+class TimelineEntry(models.Model):
+    """ A post pushed into a follower's materialized home timeline (see posts/timeline.py) """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    # Copy of post.created_at so a page of the feed is a range scan on one index
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of user {self.user_id}"
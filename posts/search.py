@@ -0,0 +1,3 @@
+from lablinker.search import FullTextIndex
+
+post_index = FullTextIndex('posts', table='posts_post', columns=['content'])
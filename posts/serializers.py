@@ -1,9 +1,13 @@
 from rest_framework import serializers
 
-from auth_app.serializers import UserSerializer
-from likes.models import Like
+from django.db.models.manager import BaseManager
+
+from auth_app.loader import UserLoader
+from auth_app.serializers import EmbeddedUserField
+from lablinker.viewer_state import ViewerState
+from mediastore.renditions import preferred_url, rendition_urls, wants_originals
 from .models import Post, PostFile, Tag, Category, Bookmark
-from comments.models import Comment
+from .uploads import spool_upload
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,20 +20,40 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'color']
 
 class PostFileSerializer(serializers.ModelSerializer):
-    file = serializers.ImageField(use_url=True)
+    # Clients get resized derivatives; the original is only exposed on ?include_originals=true
     file_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    original_url = serializers.SerializerMethodField()
 
     def get_file_url(self, obj):
-        if obj.file:
-            return obj.file.url  # Cloudinary provides the full URL
+        return preferred_url(obj.file, obj.renditions, 'full', self.context.get('request'))
+
+    def get_srcset(self, obj):
+        return rendition_urls(obj.renditions, self.context.get('request'))
+
+    def get_original_url(self, obj):
+        request = self.context.get('request')
+        if obj.file and wants_originals(request):
+            return request.build_absolute_uri(obj.file.url)
         return None
     
     class Meta:
         model = PostFile
-        fields = ['file', 'file_url']
+        fields = ['id', 'file_url', 'srcset', 'original_url', 'status']
+        read_only_fields = ['status']
+
+class PostListSerializer(serializers.ListSerializer):
+    """ Resolves the viewer's likes, bookmarks and follows for the whole page up front """
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, BaseManager) else data)
+        request = self.context.get('request')
+        ViewerState.for_request(request).prime_posts(posts)
+        UserLoader.for_request(request).want(post.author_id for post in posts)
+        return super().to_representation(posts)
 
 class PostSerializer(serializers.ModelSerializer):
-    author = UserSerializer(read_only=True)  # Use a nested serializer for the user
+    author = EmbeddedUserField()
     category = CategorySerializer(read_only=True)
     tags = serializers.ListField(
         child=serializers.CharField(max_length=50), 
@@ -43,9 +67,10 @@ class PostSerializer(serializers.ModelSerializer):
         required=False
     )
     uploaded_files = PostFileSerializer(many=True, read_only=True, source='files')
-    likes_count = serializers.SerializerMethodField()
-    comment_count = serializers.SerializerMethodField()
-    liked_by = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(source='like_count', read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+    bookmark_count = serializers.IntegerField(read_only=True)
+    is_liked = serializers.SerializerMethodField()
     is_bookmarked = serializers.SerializerMethodField()
 
     class Meta:
@@ -53,27 +78,19 @@ class PostSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'content', 'author', 'category',
             'tags', 'tag_names', 'files', 'uploaded_files', 
-            'likes_count', 'liked_by', 'comment_count', 'is_bookmarked',
+            'likes_count', 'is_liked', 'comment_count', 'bookmark_count', 'is_bookmarked',
             'created_at', 'updated_at'
         ]
+        list_serializer_class = PostListSerializer
 
     def get_tag_names(self, obj):
         return [tag.name for tag in obj.tags.all()]
     
-    def get_likes_count(self, obj):
-        return Like.objects.filter(post=obj).count()
-    
-    def get_comment_count(self, obj):
-        return Comment.objects.filter(post=obj).count()
-    
-    def get_liked_by(self, obj):
-        return Like.objects.filter(post=obj).values_list('user_id', flat=True)
+    def get_is_liked(self, obj):
+        return ViewerState.for_request(self.context.get('request')).is_liked(obj.id)
 
     def get_is_bookmarked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Bookmark.objects.filter(user=request.user, post=obj).exists()
-        return False
+        return ViewerState.for_request(self.context.get('request')).is_bookmarked(obj.id)
 
     def create(self, validated_data):
         tag_names = validated_data.pop('tags', [])
@@ -85,8 +102,9 @@ class PostSerializer(serializers.ModelSerializer):
             tags = [Tag.objects.get_or_create(name=tag_name)[0] for tag_name in tag_names]
             post.tags.set(tags)
 
+        # Files are stored in the background; the response reports them as pending
         for file in files_data:
-            PostFile.objects.create(post=post, file=file)
+            spool_upload(post, file)
         
         return post
 
@@ -104,7 +122,7 @@ class PostSerializer(serializers.ModelSerializer):
 
         if files_data:
             for file in files_data:
-                PostFile.objects.create(post=instance, file=file)
+                spool_upload(instance, file)
 
         return instance
     
@@ -117,11 +135,40 @@ class PostSerializer(serializers.ModelSerializer):
 
         return representation
 
+class PostDetailSerializer(PostSerializer):
+    """ A single post, with every liker id (list responses only carry is_liked) """
+    liked_by = serializers.SerializerMethodField()
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ['liked_by']
+
+    def get_liked_by(self, obj):
+        return list(obj.likes.values_list('user_id', flat=True))
+
+class PostSearchResultSerializer(PostSerializer):
+    rank = serializers.FloatField(source='search_rank', read_only=True)
+    highlight = serializers.CharField(source='search_highlight', read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ['rank', 'highlight']
+
+class BookmarkListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        bookmarks = list(data.all() if isinstance(data, BaseManager) else data)
+        request = self.context.get('request')
+        ViewerState.for_request(request).prime_posts([bookmark.post for bookmark in bookmarks])
+        UserLoader.for_request(request).want(
+            [bookmark.user_id for bookmark in bookmarks] + [bookmark.post.author_id for bookmark in bookmarks]
+        )
+        return super().to_representation(bookmarks)
+
 class BookmarkSerializer(serializers.ModelSerializer):
     post = PostSerializer(read_only=True)
-    user = UserSerializer(read_only=True)
+    user = EmbeddedUserField()
     
     class Meta:
         model = Bookmark
         fields = ['id', 'post', 'user', 'created_at']
-        read_only_fields = ['user', 'created_at']
\ No newline at end of file
+        read_only_fields = ['user', 'created_at']
+        list_serializer_class = BookmarkListSerializer
\ No newline at end of file
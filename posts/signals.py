@@ -0,0 +1,67 @@
+"""
+Invalidate cached posts and listing validators (see posts/cache.py), and
+viewers' cached likes/bookmarks/follows (see lablinker/viewer_state.py),
+whenever something they serialize changes.
+"""
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from lablinker import viewer_state
+from .cache import invalidate_categories_on_commit, invalidate_collection_on_commit, invalidate_on_commit
+from .models import Category, Post
+
+
+def invalidate_post(sender, instance, **kwargs):
+    invalidate_on_commit(instance.pk)
+
+
+def invalidate_related_post(sender, instance, **kwargs):
+    invalidate_on_commit(instance.post_id)
+
+
+def invalidate_tagged_post(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_on_commit(instance.pk)
+    else:
+        for post_id in pk_set or ():
+            invalidate_on_commit(post_id)
+
+
+def invalidate_collection(sender, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no listing shows
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_collection_on_commit()
+
+
+def invalidate_categories(sender, **kwargs):
+    invalidate_categories_on_commit()
+
+
+def invalidate_viewer_likes(sender, instance, **kwargs):
+    viewer_state.invalidate('liked', instance.user_id)
+
+
+def invalidate_viewer_bookmarks(sender, instance, **kwargs):
+    viewer_state.invalidate('bookmarked', instance.user_id)
+
+
+def invalidate_viewer_follows(sender, instance, **kwargs):
+    viewer_state.invalidate('following', instance.follower_id)
+
+
+def connect_signals():
+    for signal in (post_save, post_delete):
+        signal.connect(invalidate_post, sender=Post)
+        for sender in ('posts.PostFile', 'posts.Bookmark', 'likes.Like', 'comments.Comment'):
+            signal.connect(invalidate_related_post, sender=sender)
+        # Authors are listed with their follower counts and the viewer's follow state
+        signal.connect(invalidate_collection, sender='auth_app.Follow')
+        signal.connect(invalidate_collection, sender=settings.AUTH_USER_MODEL)
+        signal.connect(invalidate_categories, sender=Category)
+        signal.connect(invalidate_viewer_likes, sender='likes.Like')
+        signal.connect(invalidate_viewer_bookmarks, sender='posts.Bookmark')
+        signal.connect(invalidate_viewer_follows, sender='auth_app.Follow')
+    m2m_changed.connect(invalidate_tagged_post, sender=Post.tags.through)
@@ -1,3 +1,508 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from auth_app.models import Follow
+from lablinker import conditional
+from comments.models import Comment
+from likes.models import Like
+from . import cache as post_cache
+from .models import Post, PostFile, Bookmark, Category, Tag, TimelineEntry
+from .search import post_index
+
+
+class PostPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='author', email='author@example.com', password='testpassword123'
+        )
+        self.posts = [Post.objects.create(author=self.user, content=f'post {i}') for i in range(5)]
+        # Give two posts the same timestamp so the id tie-breaker is exercised
+        Post.objects.filter(id=self.posts[3].id).update(created_at=self.posts[2].created_at)
+        self.client = APIClient()
+
+    def test_pages_walk_forward_and_back(self):
+        url = reverse('post-list-create')
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        seen = []
+        pages = []
+        next_url = f'{url}?page_size=2'
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            seen.extend(post['id'] for post in response.data['results'])
+            next_url = response.data['next']
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+
+        response = self.client.get(pages[2]['previous'])
+        self.assertEqual([post['id'] for post in response.data['results']], expected[2:4])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([post['id'] for post in response.data['results']], expected[:2])
+        self.assertIsNone(response.data['previous'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('post-list-create'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # The right shape with values of the wrong types
+        url = reverse('posts-by-user', kwargs={'user_id': self.user.id})
+        for position in (['x', 'y'], [None, None], [{}, []]):
+            cursor = base64.urlsafe_b64encode(json.dumps({'p': position}).encode()).decode()
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+
+
+class PostListQueryCountTestCase(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.viewer = User.objects.create_user(
+            username='viewer', email='viewer@example.com', password='testpassword123'
+        )
+        self.authors = [
+            User.objects.create_user(username=f'author{i}', email=f'author{i}@example.com', password='pw')
+            for i in range(3)
+        ]
+        Follow.objects.create(follower=self.viewer, following=self.authors[0])
+        call_command('reconcile_follow_counters', stdout=StringIO())
+        self.category = Category.objects.create(name='Virology')
+        self.tag = Tag.objects.create(name='pcr')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                author=self.authors[i % len(self.authors)], content=f'post {i}', category=self.category,
+                like_count=1, comment_count=1,
+            )
+            post.tags.add(self.tag)
+            Like.objects.create(user=self.viewer, post=post)
+            Comment.objects.create(post=post, author=self.authors[0], content='nice')
+            if i % 2:
+                Bookmark.objects.create(user=self.viewer, post=post)
+
+    def fetch_page(self):
+        response = self.client.get(reverse('post-list-create'), {'page_size': 50})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    @override_settings(VIEWER_STATE_CACHE_TIMEOUT=0)
+    def test_query_count_does_not_grow_with_page_size(self):
+        # Posts with categories, tags, files, the viewer's likes, bookmarks and follows, then the authors
+        self.create_posts(2)
+        with self.assertNumQueries(7):
+            self.fetch_page()
+
+        self.create_posts(20)
+        with self.assertNumQueries(7):
+            results = self.fetch_page()
+
+        self.assertEqual(len(results), 22)
+        first = results[0]
+        self.assertEqual(first['likes_count'], 1)
+        self.assertEqual(first['comment_count'], 1)
+        self.assertTrue(first['is_liked'])
+        self.assertNotIn('liked_by', first)
+        self.assertEqual(first['tag_names'], ['pcr'])
+        self.assertEqual(sum(post['is_bookmarked'] for post in results), 11)
+        followed = [post for post in results if post['author']['id'] == self.authors[0].id]
+        self.assertTrue(all(post['author']['is_following'] for post in followed))
+        self.assertEqual(followed[0]['author']['followers_count'], 1)
+
+    def test_viewer_without_likes_or_bookmarks_hits_the_cache(self):
+        cache.clear()
+        self.create_posts(3)
+        Like.objects.filter(user=self.viewer).delete()
+        Bookmark.objects.filter(user=self.viewer).delete()
+        self.fetch_page()
+        with self.assertNumQueries(5):
+            results = self.fetch_page()
+        self.assertFalse(any(post['is_liked'] or post['is_bookmarked'] for post in results))
+
+    def test_cached_viewer_state_is_invalidated_on_toggle(self):
+        cache.clear()
+        self.create_posts(3)
+        self.fetch_page()
+        with self.assertNumQueries(5):  # Likes and bookmarks come from the cache
+            results = self.fetch_page()
+        self.assertTrue(all(post['is_liked'] for post in results))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('like-toggle', kwargs={'post_id': results[0]['id']}))
+        results = self.fetch_page()
+        self.assertEqual([post['is_liked'] for post in results], [False, True, True])
+
+
+class EngagementCounterTestCase(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='reader', email='reader@example.com', password='testpassword123'
+        )
+        self.post = Post.objects.create(author=self.user, content='counted')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_counters_follow_engagement(self):
+        self.client.post(reverse('like-toggle', kwargs={'post_id': self.post.id}))
+        self.client.post(reverse('bookmark-post', kwargs={'post_id': self.post.id}))
+        response = self.client.post(reverse('comment-create'), {'post': self.post.id, 'content': 'first'})
+        self.client.post(reverse('comment-create'), {'post': self.post.id, 'content': 'reply', 'parent': response.data['id']})
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count, self.post.bookmark_count), (1, 2, 1))
+
+        self.client.post(reverse('like-toggle', kwargs={'post_id': self.post.id}))
+        self.client.delete(reverse('unbookmark-post', kwargs={'post_id': self.post.id}))
+        self.client.delete(reverse('comment-detail', kwargs={'comment_id': response.data['id']}))
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count, self.post.bookmark_count), (0, 0, 0))
+
+    def test_reconcile_counters_repairs_drift(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(id=self.post.id).update(comment_count=7)
+
+        out = StringIO()
+        call_command('reconcile_counters', chunk_size=1, stdout=out)
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 0))
+        self.assertIn('repaired 1', out.getvalue())
+
+
+class PostDetailCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = get_user_model().objects.create_user(
+            username='author', email='author@example.com', password='testpassword123'
+        )
+        self.reader = get_user_model().objects.create_user(
+            username='reader', email='reader@example.com', password='testpassword123'
+        )
+        self.post = Post.objects.create(author=self.author, content='cached')
+        self.url = reverse('post-detail', kwargs={'post_id': self.post.id})
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_hits_are_cheap_and_engagement_invalidates(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['likes_count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('like-toggle', kwargs={'post_id': self.post.id}))
+        response = self.client.get(self.url)
+        self.assertEqual((response.data['likes_count'], response.data['liked_by']), (1, [self.reader.id]))
+
+        staff = get_user_model().objects.create_user(
+            username='staff', email='staff@example.com', password='testpassword123', is_staff=True
+        )
+        self.client.force_authenticate(staff)
+        response = self.client.get(reverse('post-cache-stats'))
+        self.assertEqual((response.data['hits'], response.data['misses']), (1, 2))
+
+    def test_request_dependent_renderings_are_cached_apart(self):
+        self.client.get(self.url)
+        self.client.get(self.url, {'include_originals': 'true'})
+        self.client.get(self.url, HTTP_HOST='mirror.example.org')
+        self.client.get(self.url, HTTP_HOST='mirror.example.org')
+        self.assertEqual(post_cache.stats()['misses'], 3)
+        self.assertEqual(post_cache.stats()['hits'], 1)
+
+    def test_viewer_state_is_overlaid_per_request(self):
+        Bookmark.objects.create(user=self.reader, post=self.post)
+        Follow.objects.create(follower=self.reader, following=self.author)
+
+        response = self.client.get(self.url)
+        self.assertTrue(response.data['is_bookmarked'])
+        self.assertTrue(response.data['author']['is_following'])
+
+        response = APIClient().get(self.url)
+        self.assertFalse(response.data['is_bookmarked'])
+        self.assertFalse(response.data['author']['is_following'])
+
+        self.assertEqual(APIClient().get(reverse('post-detail', kwargs={'post_id': 0})).status_code, 404)
+
+
+class ConditionalGetTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='poller', email='poller@example.com', password='testpassword123'
+        )
+        self.post = Post.objects.create(author=self.user, content='polled')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_post_list_answers_304_until_something_changes(self):
+        url = reverse('post-list-create')
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('like-toggle', kwargs={'post_id': self.post.id}))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['likes_count'], 1)
+
+        other = APIClient()
+        self.assertNotEqual(other.get(url)['ETag'], response['ETag'])  # Validators are per viewer
+
+    def test_comment_list_uses_row_validators(self):
+        url = reverse('comment-list-create', kwargs={'post_id': self.post.id})
+        first = Comment.objects.create(post=self.post, author=self.user, content='first')
+        response = self.client.get(url)
+        # Max(updated_at) does not move when an older comment is deleted, so only the ETag is offered
+        self.assertNotIn('Last-Modified', response)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Comment.objects.create(post=self.post, author=self.user, content='second')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(len(response.data['results']), 2)
+
+        first.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(len(response.data['results']), 1)
+
+        # Embedded authors are part of the validators
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Renamed'
+            self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_versions_expire_on_a_per_process_cache(self):
+        self.assertEqual(conditional.version_timeout(), settings.CONDITIONAL_VERSION_TIMEOUT)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}):
+            self.assertIsNone(conditional.version_timeout())
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, FEED_FANOUT_MAX_FOLLOWERS=2, FEED_TIMELINE_MAX_ENTRIES=3)
+class TimelineTestCase(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pw')
+        self.author = User.objects.create_user(username='writer', email='writer@example.com', password='pw')
+        self.celebrity = User.objects.create_user(username='celeb', email='celeb@example.com', password='pw')
+        fan = User.objects.create_user(username='fan', email='fan@example.com', password='pw')
+        self.client = APIClient()
+        self.follow(fan, self.celebrity)
+
+    def publish(self, user, content):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('post-list-create'), {'content': content})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def follow(self, user, author):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('follow-user', kwargs={'user_id': author.id}))
+
+    def feed(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.get(reverse('user-feed'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['id'] for post in response.data['results']]
+
+    def test_fan_out_backfill_and_unfollow(self):
+        early = self.publish(self.author, 'before follow')
+        self.follow(self.reader, self.author)
+        self.assertEqual(self.feed(), [early])
+
+        later = self.publish(self.author, 'after follow')
+        self.assertEqual(self.feed(), [later, early])
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 2)
+
+        self.client.force_authenticate(self.reader)
+        self.client.delete(reverse('unfollow-user', kwargs={'user_id': self.author.id}))
+        self.assertEqual(self.feed(), [])
+
+    def test_high_fanout_authors_are_merged_at_read_time(self):
+        self.follow(self.reader, self.celebrity)
+        own = self.publish(self.author, 'fanned out')
+        self.follow(self.reader, self.author)
+        famous = self.publish(self.celebrity, 'pulled in')
+
+        self.assertFalse(TimelineEntry.objects.filter(post_id=famous).exists())
+        self.assertEqual(self.feed(), [famous, own])
+
+    def test_timeline_is_capped(self):
+        self.follow(self.reader, self.author)
+        posts = [self.publish(self.author, f'post {i}') for i in range(5)]
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.reader).order_by('-created_at', '-post_id').values_list('post_id', flat=True)),
+            posts[:1:-1],
+        )
+
+
+class PostSearchTestCase(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='searcher', email='searcher@example.com', password='testpassword123'
+        )
+        self.virology = Category.objects.create(name='Virology')
+        self.pcr = Post.objects.create(author=self.user, content='Optimising PCR cycles for viral RNA', category=self.virology)
+        self.pcr.tags.add(Tag.objects.create(name='pcr'))
+        self.gel = Post.objects.create(author=self.user, content='Gel electrophoresis after PCR, PCR and more PCR')
+        Post.objects.create(author=self.user, content='Cell culture media recipes')
+        self.client = APIClient()
+
+    def search(self, **params):
+        response = self.client.get(reverse('post-search'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_ranked_results_with_highlights(self):
+        results = self.search(q='pcr')
+        self.assertEqual([post['id'] for post in results], [self.gel.id, self.pcr.id])
+        self.assertIn('<mark>PCR</mark>', results[0]['highlight'])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+
+    def test_highlights_escape_post_content(self):
+        Post.objects.create(author=self.user, content='<img src=x onerror=alert(1)> ELISA')
+        highlight = self.search(q='elisa')[0]['highlight']
+        self.assertEqual(highlight, '&lt;img src=x onerror=alert(1)&gt; <mark>ELISA</mark>')
+
+    def test_other_databases_fall_back_to_icontains(self):
+        hits = post_index._search_fallback(['pcr'], None, limit=20, offset=0, snippets=True)
+        self.assertEqual([hit.pk for hit in hits], [self.gel.id, self.pcr.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        Post.objects.filter(id=self.gel.id).update(content='Western blot transfer')
+        self.assertEqual([post['id'] for post in self.search(q='pcr')], [self.pcr.id])
+        self.assertEqual([post['id'] for post in self.search(q='western blot')], [self.gel.id])
+
+        self.pcr.delete()
+        self.assertEqual(self.search(q='pcr'), [])
+
+    def test_filters_and_validation(self):
+        self.assertEqual([post['id'] for post in self.search(q='pcr', category=self.virology.id)], [self.pcr.id])
+        self.assertEqual([post['id'] for post in self.search(q='pcr', tag='pcr')], [self.pcr.id])
+        self.assertEqual(self.search(q='pcr', tag='elisa'), [])
+        response = self.client.get(reverse('post-search'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command(self):
+        call_command('rebuild_search_index', 'posts', stdout=StringIO())
+        self.assertEqual(len(self.search(q='pcr')), 2)
+
+
+class PostUploadPipelineTestCase(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.spool_root = tempfile.mkdtemp()
+        for directory in (self.media_root, self.spool_root):
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, MEDIA_SPOOL_ROOT=self.spool_root,
+            BACKGROUND_TASKS_EAGER=True, MEDIA_UPLOAD_RETRY_BACKOFF=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            username='uploader', email='uploader@example.com', password='testpassword123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_post(self):
+        files = [SimpleUploadedFile(f'gel{i}.jpg', f'image {i}'.encode()) for i in range(2)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('post-list-create'), {'content': 'two gels', 'files': files}, format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response
+
+    def test_files_are_pending_in_response_then_stored(self):
+        response = self.create_post()
+        self.assertEqual([f['status'] for f in response.data['uploaded_files']], ['pending', 'pending'])
+        self.assertTrue(all(f['file_url'] is None for f in response.data['uploaded_files']))
+
+        response = self.client.get(reverse('post-files', kwargs={'post_id': response.data['id']}))
+        self.assertEqual([f['status'] for f in response.data], ['ready', 'ready'])
+        self.assertTrue(all('/media/blobs/' in f['file_url'] for f in response.data))
+        self.assertEqual(os.listdir(self.spool_root), [])
+
+    @override_settings(MEDIA_UPLOAD_MAX_ATTEMPTS=2)
+    def test_failed_uploads_are_retried_then_marked_failed(self):
+        with mock.patch('mediastore.storage.LocalContentStorage._store_blob', side_effect=OSError('disk full')) as store, \
+                self.assertLogs('posts.uploads', 'WARNING'):
+            self.create_post()
+
+        self.assertEqual(store.call_count, 4)
+        self.assertEqual(
+            list(PostFile.objects.values_list('status', 'attempts')),
+            [(PostFile.STATUS_FAILED, 2), (PostFile.STATUS_FAILED, 2)],
+        )
+        self.assertEqual(os.listdir(self.spool_root), [])
+
+    def test_images_get_metadata_free_derivatives(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Microscope Co'  # Make
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 600), 'red').save(buffer, 'JPEG', exif=exif)
+        upload = SimpleUploadedFile('gel.jpg', buffer.getvalue(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('post-list-create'), {'content': 'one gel', 'files': [upload]}, format='multipart'
+            )
+
+        post_file = PostFile.objects.get(post_id=response.data['id'])
+        self.assertEqual(sorted(post_file.renditions), ['full', 'medium', 'thumb'])
+        self.assertEqual((post_file.renditions['thumb']['width'], post_file.renditions['thumb']['height']), (320, 160))
+        self.assertEqual(post_file.renditions['full']['width'], 1200)  # never upscaled
+        for rendition in post_file.renditions.values():
+            for name in (rendition['webp'], rendition['jpeg']):
+                with Image.open(os.path.join(self.media_root, name)) as image:
+                    self.assertFalse(image.getexif())
+
+        response = self.client.get(reverse('post-files', kwargs={'post_id': response.data['id']}))
+        data = response.data[0]
+        self.assertTrue(data['srcset']['medium']['webp'].endswith('.webp'))
+        self.assertTrue(data['file_url'].endswith(post_file.renditions['full']['jpeg']))
+        self.assertIsNone(data['original_url'])
+
+        response = self.client.get(
+            reverse('post-files', kwargs={'post_id': post_file.post_id}), {'include_originals': 'true'}
+        )
+        self.assertIn('/media/blobs/', response.data[0]['original_url'])
@@ -0,0 +1,133 @@
+"""
+Fan-out-on-write home timelines.
+
+Creating a post pushes its id into a TimelineEntry row for every follower of
+the author, so reading the feed is a range scan on (user, created_at, post).
+Authors with FEED_FANOUT_MAX_FOLLOWERS or more followers are not fanned out;
+their posts are merged in when the feed is read instead.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from auth_app.models import Follow
+from lablinker.pagination import KeysetPagination
+from .models import Post, TimelineEntry
+
+
+def is_high_fanout(author_id):
+    return get_user_model().objects.filter(
+        id=author_id, num_followers__gte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).exists()
+
+
+def pulled_authors(user):
+    """ Ids of the authors `user` follows whose posts are merged in at read time """
+    return list(
+        get_user_model().objects
+        .filter(follower_relationships__follower=user, num_followers__gte=settings.FEED_FANOUT_MAX_FOLLOWERS)
+        .values_list('id', flat=True)
+    )
+
+
+def trim_timelines(user_ids):
+    """ Drop entries beyond FEED_TIMELINE_MAX_ENTRIES for each of `user_ids` """
+    overflow = (
+        TimelineEntry.objects.filter(user_id__in=user_ids)
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('created_at').desc(), F('post_id').desc()],
+        ))
+        .filter(rank__gt=settings.FEED_TIMELINE_MAX_ENTRIES)
+        .values_list('id', flat=True)
+    )
+    ids = list(overflow)
+    if ids:
+        TimelineEntry.objects.filter(id__in=ids).delete()
+
+
+def _push(user_ids, post_id, created_at):
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    trim_timelines(user_ids)
+
+
+def fan_out_post(post_id):
+    """ Push a new post into the timeline of every follower of its author """
+    post = Post.objects.filter(id=post_id).values('author_id', 'created_at').first()
+    if post is None or is_high_fanout(post['author_id']):
+        return
+
+    batch_size = settings.FEED_FANOUT_BATCH_SIZE
+    follower_ids = (
+        Follow.objects.filter(following_id=post['author_id'])
+        .order_by()
+        .values_list('follower_id', flat=True)
+    )
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=batch_size):
+        batch.append(follower_id)
+        if len(batch) >= batch_size:
+            _push(batch, post_id, post['created_at'])
+            batch = []
+    if batch:
+        _push(batch, post_id, post['created_at'])
+
+
+def backfill_author(user_id, author_id):
+    """ Copy an author's recent posts into a new follower's timeline """
+    if is_high_fanout(author_id):
+        return
+    # The follow may have been undone before this task got to run
+    if not Follow.objects.filter(follower_id=user_id, following_id=author_id).exists():
+        return
+
+    recent = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:settings.FEED_TIMELINE_MAX_ENTRIES]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at) for post_id, created_at in recent],
+        ignore_conflicts=True,
+    )
+    trim_timelines([user_id])
+
+
+def remove_author(user_id, author_id):
+    """ Take an unfollowed author's posts out of a timeline """
+    TimelineEntry.objects.filter(user_id=user_id, post__author_id=author_id).delete()
+
+
+class TimelinePagination(KeysetPagination):
+    """
+    Keyset pagination over the viewer's TimelineEntry rows, merged with the
+    posts of high-fanout authors they follow. The paginated queryset is only
+    used to hydrate the selected post ids.
+    """
+
+    def fetch(self, queryset):
+        user = self.request.user
+        limit = self.page_size + 1
+        ordering = self.get_ordering(self.reverse)
+        entry_ordering = [field.replace('id', 'post_id') if field.lstrip('-') == 'id' else field for field in ordering]
+
+        rows = list(
+            self.seek(TimelineEntry.objects.filter(user=user), entry_ordering)
+            .values_list('created_at', 'post_id')[:limit]
+        )
+        authors = pulled_authors(user)
+        if authors:
+            rows += list(
+                self.seek(Post.objects.filter(author_id__in=authors), ordering)
+                .values_list('created_at', 'id')[:limit]
+            )
+
+        rows = sorted(set(rows), reverse=ordering[0].startswith('-'))[:limit]
+        post_ids = [post_id for _, post_id in rows]
+        posts = queryset.in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
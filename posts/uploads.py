@@ -0,0 +1,101 @@
+"""
+Background upload pipeline for post attachments.
+
+Requests only stream each uploaded file to MEDIA_SPOOL_ROOT and create a
+`pending` PostFile; the 'uploads' worker pool then pushes the spooled file to
+the media storage backend, retrying with exponential backoff, and marks the
+row `ready` or `failed`.
+"""
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files import File
+
+from lablinker import background
+from mediastore.renditions import render_renditions
+from .cache import invalidate_on_commit
+from .models import PostFile
+
+logger = logging.getLogger(__name__)
+
+
+def spool_upload(post, upload):
+    """ Write `upload` to the spool and queue it for storage; returns the pending PostFile """
+    os.makedirs(settings.MEDIA_SPOOL_ROOT, exist_ok=True)
+    extension = os.path.splitext(upload.name)[1].lower()[:16]
+    fd, spool_path = tempfile.mkstemp(dir=settings.MEDIA_SPOOL_ROOT, suffix=extension)
+    with os.fdopen(fd, 'wb') as handle:
+        for chunk in upload.chunks():
+            handle.write(chunk)
+
+    post_file = PostFile.objects.create(
+        post=post,
+        status=PostFile.STATUS_PENDING,
+        original_name=os.path.basename(upload.name)[:255],
+        spool_path=spool_path,
+    )
+    background.submit_on_commit(store_post_file, post_file.id, spool_path, pool='uploads')
+    return post_file
+
+
+def _discard_spool(spool_path):
+    try:
+        os.remove(spool_path)
+    except FileNotFoundError:
+        pass
+
+
+def store_post_file(post_file_id, spool_path):
+    """ Push a spooled file to the media storage backend """
+    post_file = PostFile.objects.filter(id=post_file_id, status=PostFile.STATUS_PENDING).first()
+    if post_file is None:
+        # The post was deleted (or the file already handled) while queued
+        _discard_spool(spool_path)
+        return
+
+    max_attempts = settings.MEDIA_UPLOAD_MAX_ATTEMPTS
+    while True:
+        post_file.attempts += 1
+        try:
+            with open(spool_path, 'rb') as handle:
+                post_file.file.save(post_file.original_name or os.path.basename(spool_path), File(handle), save=False)
+            break
+        except Exception:
+            logger.warning("Upload of PostFile %s failed (attempt %s/%s)", post_file_id,
+                           post_file.attempts, max_attempts, exc_info=True)
+            if post_file.attempts >= max_attempts:
+                post_file.status = PostFile.STATUS_FAILED
+                post_file.spool_path = ''
+                post_file.save(update_fields=['status', 'spool_path', 'attempts'])
+                _discard_spool(spool_path)
+                return
+            time.sleep(settings.MEDIA_UPLOAD_RETRY_BACKOFF * 2 ** (post_file.attempts - 1))
+
+    # Derivatives come from the spooled copy, so remote backends are never read back
+    try:
+        with open(spool_path, 'rb') as handle:
+            post_file.renditions = render_renditions(handle.read())
+    except Exception:
+        logger.exception("Rendering derivatives of PostFile %s failed", post_file_id)
+
+    post_file.status = PostFile.STATUS_READY
+    post_file.spool_path = ''
+    post_file.save(update_fields=['file', 'status', 'spool_path', 'attempts', 'renditions'])
+    _discard_spool(spool_path)
+
+
+def resume_pending_uploads():
+    """ Re-queue pending uploads whose worker died, e.g. across a restart; returns how many """
+    pending = PostFile.objects.filter(status=PostFile.STATUS_PENDING).exclude(spool_path='')
+    count = 0
+    for post_file_id, post_id, spool_path in pending.values_list('id', 'post_id', 'spool_path').iterator():
+        if os.path.exists(spool_path):
+            background.submit(store_post_file, post_file_id, spool_path, pool='uploads')
+        else:
+            PostFile.objects.filter(id=post_file_id).update(status=PostFile.STATUS_FAILED, spool_path='')
+            invalidate_on_commit(post_id)
+        count += 1
+    return count
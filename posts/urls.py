@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import (
-    PostListCreateView, PostDetailView, CategoryListView, CategoryDetailView,
+    PostListCreateView, PostDetailView, PostSearchView, PostFilesView, PostCacheStatsView, CategoryListView, CategoryDetailView,
     BookmarkPostView, UnbookmarkPostView, UserBookmarksView, 
     PostsByCategoryView, UserFeedView, PostsByUserView
 )
@@ -8,6 +8,9 @@ from .views import (
 urlpatterns = [
     path('', PostListCreateView.as_view(), name='post-list-create'),
     path('<int:post_id>/', PostDetailView.as_view(), name='post-detail'),
+    path('<int:post_id>/files/', PostFilesView.as_view(), name='post-files'),
+    path('search/', PostSearchView.as_view(), name='post-search'),
+    path('cache-stats/', PostCacheStatsView.as_view(), name='post-cache-stats'),
     
     # Category URLs
     path('categories/', CategoryListView.as_view(), name='category-list'),
@@ -2,21 +2,44 @@ from rest_framework import generics, status
 from rest_framework.exceptions import PermissionDenied, NotFound
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Post, Category, Bookmark
-from .serializers import PostSerializer, CategorySerializer, BookmarkSerializer
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Value
+from .models import Post, PostFile, Category, Bookmark
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .search import post_index
+from .serializers import (
+    PostSerializer, PostDetailSerializer, PostSearchResultSerializer, PostFileSerializer, CategorySerializer,
+    BookmarkSerializer,
+)
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser
+from auth_app.models import Follow
+from likes.models import Like
+from lablinker import background
+from lablinker.conditional import ConditionalGetMixin
+from . import cache as post_cache
+from lablinker.pagination import KeysetPagination
+from .timeline import TimelinePagination, fan_out_post
 
-class PostListCreateView(generics.ListCreateAPIView):
+class PostListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+
+    def get_validators(self, request):
+        return (post_cache.collection_version(),), None
+
+    def get_queryset(self):
+        return Post.objects.for_listing()
 
     def get(self, request, *args, **kwargs):
-        """ Get all posts """
+        """ Get a page of posts, newest first """
         try:
-            posts = Post.objects.all().order_by('-created_at')
-            serializer = PostSerializer(posts, many=True, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            page = self.paginate_queryset(self.get_queryset())
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        except NotFound:
+            raise
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -32,24 +55,104 @@ class PostListCreateView(generics.ListCreateAPIView):
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     def perform_create(self, serializer):
-        """ Set the author to the current user """
-        serializer.save(author=self.request.user)
+        """ Set the author to the current user and push the post to followers' timelines """
+        post = serializer.save(author=self.request.user)
+        background.submit_on_commit(fan_out_post, post.id)
+
+class PostSearchView(generics.GenericAPIView):
+    serializer_class = PostSearchResultSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    default_limit = 20
+    max_limit = 50
+
+    def get(self, request, *args, **kwargs):
+        """ Ranked full-text search over post content, optionally filtered by category and tag """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"detail": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({"detail": "limit and offset must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        restrict = None
+        category = request.query_params.get('category')
+        tag = request.query_params.get('tag')
+        if category or tag:
+            restrict = Post.objects.all()
+            if category:
+                if not category.isdigit():
+                    return Response({"detail": "category must be a category id."}, status=status.HTTP_400_BAD_REQUEST)
+                restrict = restrict.filter(category_id=category)
+            if tag:
+                restrict = restrict.filter(tags__name=tag)
+
+        hits = post_index.search(query, restrict=restrict, limit=limit + 1, offset=offset)
+        has_more = len(hits) > limit
+        hits = hits[:limit]
+
+        posts = Post.objects.for_listing().in_bulk([hit.pk for hit in hits])
+        results = []
+        for hit in hits:
+            post = posts.get(hit.pk)
+            if post is not None:
+                post.search_rank = hit.rank
+                post.search_highlight = hit.snippet
+                results.append(post)
+
+        serializer = self.get_serializer(results, many=True)
+        url = request.build_absolute_uri()
+        next_url = replace_query_param(url, 'offset', offset + limit) if has_more else None
+        previous_url = None
+        if offset > 0:
+            previous_offset = max(offset - limit, 0)
+            previous_url = (
+                replace_query_param(url, 'offset', previous_offset) if previous_offset
+                else remove_query_param(url, 'offset')
+            )
+        return Response({
+            'next': next_url,
+            'previous': previous_url,
+            'results': serializer.data,
+        }, status=status.HTTP_200_OK)
 
 class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Post.objects.all()
-    serializer_class = PostSerializer
+    serializer_class = PostDetailSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     lookup_field = 'id'  # Use 'id' as the lookup field in the model
 
     def get(self, request, post_id, *args, **kwargs):
         """ Get a single post by post_id """
-        try:
-            post = Post.objects.get(id=post_id)  # Use post_id to get the post based on 'id' field
-            serializer = self.get_serializer(post, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Post.DoesNotExist:
+        # One cheap query for existence and the viewer's state; the rest comes from posts/cache.py
+        viewer = request.user
+        if viewer.is_authenticated:
+            state = Post.objects.filter(id=post_id).annotate(
+                is_liked=Exists(Like.objects.filter(user=viewer, post=OuterRef('pk'))),
+                is_bookmarked=Exists(Bookmark.objects.filter(user=viewer, post=OuterRef('pk'))),
+                is_following=Exists(Follow.objects.filter(follower=viewer, following=OuterRef('author'))),
+            )
+        else:
+            state = Post.objects.filter(id=post_id).annotate(
+                is_liked=Value(False), is_bookmarked=Value(False), is_following=Value(False),
+            )
+        state = state.values('is_liked', 'is_bookmarked', 'is_following').first()
+        if state is None:
             raise NotFound(detail=f"Post with id {post_id} not found.")
 
+        def render():
+            try:
+                post = Post.objects.for_listing().get(id=post_id)
+            except Post.DoesNotExist:
+                raise NotFound(detail=f"Post with id {post_id} not found.")
+            return self.get_serializer(post, context={'request': request}).data
+
+        data = post_cache.get_or_render(post_id, render, post_cache.request_variant(request))
+        data = {**data, 'is_liked': state['is_liked'], 'is_bookmarked': state['is_bookmarked']}
+        data['author'] = {**data['author'], 'is_following': state['is_following']}
+        return Response(data, status=status.HTTP_200_OK)
+
     def patch(self, request, post_id, *args, **kwargs):
         """ Partial update a post """
         try:
@@ -91,11 +194,29 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
         """ Perform the update operation """
         serializer.save()
 
-class CategoryListView(generics.ListAPIView):
+class PostCacheStatsView(APIView):
+    """ Hit/miss counters of the post detail cache """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(post_cache.stats(), status=status.HTTP_200_OK)
+
+class PostFilesView(generics.ListAPIView):
+    """ Attachments of a post with their upload status; cheap to poll while uploads are pending """
+    serializer_class = PostFileSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get_queryset(self):
+        return PostFile.objects.filter(post_id=self.kwargs['post_id']).order_by('id')
+
+class CategoryListView(ConditionalGetMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    def get_validators(self, request):
+        return (post_cache.category_version(),), None
+
 class CategoryDetailView(generics.RetrieveAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -110,10 +231,14 @@ class BookmarkPostView(APIView):
         except Post.DoesNotExist:
             return Response({"detail": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
         
-        bookmark, created = Bookmark.objects.get_or_create(
-            user=request.user,
-            post=post
-        )
+        with transaction.atomic():
+            bookmark, created = Bookmark.objects.get_or_create(
+                user=request.user,
+                post=post
+            )
+            if created:
+                Post.objects.filter(id=post.id).update(bookmark_count=F('bookmark_count') + 1)
+                post.refresh_from_db(fields=['bookmark_count'])
         serializer = BookmarkSerializer(bookmark, context={'request': request})
         if created:
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -129,42 +254,48 @@ class UnbookmarkPostView(APIView):
         except Post.DoesNotExist:
             return Response({"detail": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
         
-        try:
-            bookmark = Bookmark.objects.get(user=request.user, post=post)
-            bookmark.delete()
-            return Response({"detail": "Post unbookmarked successfully."}, status=status.HTTP_200_OK)
-        except Bookmark.DoesNotExist:
-            return Response({"detail": "Post not bookmarked."}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            # Only the request that actually removes the row decrements the counter
+            if not Bookmark.objects.filter(user=request.user, post=post).delete()[0]:
+                return Response({"detail": "Post not bookmarked."}, status=status.HTTP_400_BAD_REQUEST)
+            Post.objects.filter(id=post.id).update(bookmark_count=F('bookmark_count') - 1)
+        return Response({"detail": "Post unbookmarked successfully."}, status=status.HTTP_200_OK)
 
 class UserBookmarksView(generics.ListAPIView):
     serializer_class = BookmarkSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return Bookmark.objects.filter(user=self.request.user)
+        user = self.request.user
+        return Bookmark.objects.filter(user=user).prefetch_related(
+            Prefetch('post', queryset=Post.objects.for_listing()),
+        )
 
 class PostsByCategoryView(generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         category_id = self.kwargs.get('category_id')
-        return Post.objects.filter(category_id=category_id)
+        return Post.objects.for_listing().filter(category_id=category_id)
 
 class UserFeedView(generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
+    # Reads the materialized timeline of posts from followed users, see posts/timeline.py
+    pagination_class = TimelinePagination
     
     def get_queryset(self):
-        # Get posts from users that the current user follows
-        following_users = self.request.user.following.all()
-        return Post.objects.filter(author__in=following_users)
+        return Post.objects.for_listing()
 
 class PostsByUserView(generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
-        return Post.objects.filter(author_id=user_id)
+        return Post.objects.for_listing().filter(author_id=user_id)
 
@@ -0,0 +1,126 @@
+"""
+Dead-link checking for Resource.link.
+
+`check_links` walks resources whose link was never checked or was last
+checked more than LINK_CHECK_INTERVAL seconds ago, stalest first, and
+probes each distinct URL once. A batch of URLs is probed concurrently
+with asyncio. The total is bounded by LINK_CHECK_CONCURRENCY and each host
+by LINK_CHECK_PER_HOST, so a catalog full of links to one site does not
+hammer it. A probe is a HEAD, falling back to GET for servers that reject
+HEAD. The stored ETag / Last-Modified go along as conditional headers, so
+unchanged pages answer 304 with no body. Probes go through the link
+preview transport (see resources/previews.py).
+
+Results land on the resources, so `?link_status=` can filter them.
+Passes are run from cron by `check_resource_links`, never by requests.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Resource
+from .previews import FetchError, get_transport
+
+logger = logging.getLogger(__name__)
+
+# Statuses for which a GET is worth trying after a HEAD; plenty of servers mishandle HEAD
+HEAD_FALLBACK_STATUSES = {403, 404, 405, 406, 429, 500, 501, 502, 503}
+
+
+@dataclass
+class LinkResult:
+    status: str
+    http_status: int = None
+    etag: str = ''
+    last_modified: str = ''
+
+
+def probe(transport, url, etag='', last_modified=''):
+    """ Check one URL; never raises """
+    headers = {'Accept': '*/*'}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        code, response_headers = transport.request('HEAD', url, headers)
+        if code in HEAD_FALLBACK_STATUSES:
+            code, response_headers = transport.request('GET', url, headers)
+    except FetchError as exc:
+        logger.info("Link %s is unreachable: %s", url, exc)
+        return LinkResult(Resource.LINK_UNREACHABLE)
+    except Exception:
+        logger.warning("Checking link %s failed", url, exc_info=True)
+        return LinkResult(Resource.LINK_UNREACHABLE)
+
+    if code == 304:
+        return LinkResult(Resource.LINK_OK, code, etag, last_modified)
+    if code >= 400:
+        return LinkResult(Resource.LINK_BROKEN, code)
+    return LinkResult(
+        Resource.LINK_OK, code,
+        (response_headers.get('ETag') or '')[:255],
+        (response_headers.get('Last-Modified') or '')[:64],
+    )
+
+
+async def _probe_all(targets):
+    """ {url: LinkResult} for targets [(url, etag, last_modified)] """
+    transport = get_transport()
+    loop = asyncio.get_running_loop()
+    total = asyncio.Semaphore(settings.LINK_CHECK_CONCURRENCY)
+    per_host = defaultdict(lambda: asyncio.Semaphore(settings.LINK_CHECK_PER_HOST))
+
+    with ThreadPoolExecutor(max_workers=settings.LINK_CHECK_CONCURRENCY, thread_name_prefix='linkcheck') as executor:
+        async def check(url, etag, last_modified):
+            async with per_host[urlsplit(url).hostname or ''], total:
+                return url, await loop.run_in_executor(executor, probe, transport, url, etag, last_modified)
+
+        return dict(await asyncio.gather(*(check(*target) for target in targets)))
+
+
+def stale_links(limit=None, recheck_all=False):
+    """ [(url, etag, last_modified, [resource ids])], stalest first """
+    resources = Resource.objects.exclude(Q(link__isnull=True) | Q(link=''))
+    if not recheck_all:
+        cutoff = timezone.now() - timedelta(seconds=settings.LINK_CHECK_INTERVAL)
+        resources = resources.filter(Q(link_checked_at__isnull=True) | Q(link_checked_at__lt=cutoff))
+    rows = resources.order_by(F('link_checked_at').asc(nulls_first=True), 'id').values_list(
+        'id', 'link', 'link_etag', 'link_last_modified'
+    )
+    links = {}
+    for resource_id, url, etag, last_modified in rows.iterator(chunk_size=2000):
+        if url not in links:
+            if limit and len(links) >= limit:
+                continue
+            links[url] = (etag, last_modified, [])
+        links[url][2].append(resource_id)
+    return [(url, etag, last_modified, ids) for url, (etag, last_modified, ids) in links.items()]
+
+
+def check_links(limit=None, batch_size=None, recheck_all=False):
+    """ Check stale links; returns {status: number of distinct URLs} """
+    batch_size = batch_size or settings.LINK_CHECK_BATCH_SIZE
+    links = stale_links(limit, recheck_all)
+    counts = defaultdict(int)
+    for start in range(0, len(links), batch_size):
+        batch = links[start:start + batch_size]
+        results = asyncio.run(_probe_all([(url, etag, last_modified) for url, etag, last_modified, _ in batch]))
+        checked_at = timezone.now()
+        for url, _, _, ids in batch:
+            result = results[url]
+            counts[result.status] += 1
+            # Only resources still linking there; an edited link waits for its own check
+            Resource.objects.filter(id__in=ids, link=url).update(
+                link_status=result.status, link_http_status=result.http_status, link_checked_at=checked_at,
+                link_etag=result.etag, link_last_modified=result.last_modified,
+            )
+    return dict(counts)
@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from auth_app.models import CustomUser
+from resources.models import Resource
+from resources.search import resource_index
+
+BENCH_EMAIL = 'resource-search-benchmark@example.invalid'
+QUERIES = ['crispr', 'western blot', 'plasm', 'antibody staining protocol', 'sequencing']
+WORDS = (
+    'cell culture assay buffer antibody staining imaging microscopy primer plasmid vector cloning '
+    'sequencing library genome transcript protein purification column gel western blot transfer '
+    'membrane incubation lysis extraction quantification calibration standard sample reagent kit '
+    'crispr guide knockout screening mouse tissue section fixation mounting analysis pipeline script'
+).split()
+
+
+class _Rollback(Exception):
+    pass
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = "Compare the old icontains search with the full-text index on synthetic resources (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resources', type=int, default=100_000, help="Synthetic resources (default: 100000)")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs of each query (default: 20)")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.populate(options['resources'])
+                for label, search in (('icontains (before)', self.icontains), ('full-text (after)', self.full_text)):
+                    self.report(label, [self.timed(search, query) for query in QUERIES for _ in range(options['repeat'])])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def populate(self, count):
+        user = CustomUser.objects.create(username=BENCH_EMAIL, email=BENCH_EMAIL)
+        rng = random.Random(0)
+        categories = [value for value, _ in Resource.CATEGORY_CHOICES]
+        started = time.perf_counter()
+        # The index triggers fill the full-text table as the rows go in
+        Resource.objects.bulk_create(
+            (
+                Resource(
+                    title=' '.join(rng.choices(WORDS, k=4)).capitalize(),
+                    description=' '.join(rng.choices(WORDS, k=40)),
+                    category=rng.choice(categories),
+                    created_by=user,
+                )
+                for _ in range(count)
+            ),
+            batch_size=2000,
+        )
+        self.stdout.write(f"Created and indexed {count} resources in {time.perf_counter() - started:.1f} s")
+
+    def icontains(self, query):
+        """ What SearchFilter did: every term in the title or the description """
+        condition = Q()
+        for term in query.split():
+            condition &= Q(title__icontains=term) | Q(description__icontains=term)
+        return list(Resource.objects.filter(condition).order_by('-created_at').values_list('id', flat=True)[:100])
+
+    def full_text(self, query):
+        # As FullTextSearchFilter calls it
+        return resource_index.search(query, limit=101, prefix=True, snippets=False)
+
+    def timed(self, search, query):
+        started = time.perf_counter()
+        search(query)
+        return (time.perf_counter() - started) * 1000
+
+    def report(self, label, ms):
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: p50 {statistics.median(ms):.1f} ms, p99 {percentile(ms, 99):.1f} ms ({len(ms)} searches)"
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from resources.linkcheck import check_links
+
+
+class Command(BaseCommand):
+    help = "Check resource links not checked within LINK_CHECK_INTERVAL, stalest first; meant for cron"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Check at most this many distinct links")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Links probed concurrently per batch (default: LINK_CHECK_BATCH_SIZE)")
+        parser.add_argument('--all', action='store_true', help="Check every link, however recently checked")
+
+    def handle(self, *args, **options):
+        counts = check_links(options['limit'], options['batch_size'], recheck_all=options['all'])
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items())) or 'nothing to do'
+        self.stdout.write(self.style.SUCCESS(f"Checked {sum(counts.values())} links: {summary}."))
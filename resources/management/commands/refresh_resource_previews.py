@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from resources.previews import attach_previews, fetch_previews, stale_urls
+
+
+class Command(BaseCommand):
+    help = "Unfurl resource links whose preview is missing or older than RESOURCE_PREVIEW_TTL"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help="Links fetched concurrently per batch (default: 100)",
+        )
+        parser.add_argument('--limit', type=int, default=None, help="Refresh at most this many links")
+
+    def handle(self, *args, **options):
+        urls = stale_urls(options['limit'])
+        failed = 0
+        for start in range(0, len(urls), options['batch_size']):
+            previews = fetch_previews(urls[start:start + options['batch_size']])
+            attach_previews(previews)
+            failed += sum(not preview.ok for preview in previews.values())
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {len(urls)} link previews, {failed} failed."))
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourcePreview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(unique=True)),
+                ('title', models.CharField(blank=True, max_length=300)),
+                ('description', models.TextField(blank=True)),
+                ('image', models.URLField(blank=True, max_length=1000)),
+                ('fetched_at', models.DateTimeField()),
+                ('error', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='preview',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resources', to='resources.resourcepreview'),
+        ),
+    ]
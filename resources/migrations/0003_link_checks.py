@@ -0,0 +1,48 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0002_resource_previews'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='link_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='link_etag',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='link_http_status',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='link_last_modified',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='link_status',
+            field=models.CharField(choices=[('unchecked', 'Unchecked'), ('ok', 'OK'), ('broken', 'Broken'), ('unreachable', 'Unreachable')], default='unchecked', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['link_checked_at'], name='resource_link_checked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['link_status', '-created_at'], name='resource_link_status_idx'),
+        ),
+    ]
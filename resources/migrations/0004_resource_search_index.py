@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:05
+
+from django.db import migrations
+
+from resources.search import resource_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0003_link_checks'),
+    ]
+
+    operations = [
+        # FTS5 table + triggers on SQLite, generated tsvector column + GIN index on PostgreSQL
+        migrations.RunPython(resource_index.install, resource_index.uninstall),
+    ]
@@ -2,7 +2,36 @@ from django.db import models
 from django.conf import settings
 
 
+class ResourcePreview(models.Model):
+    """ Unfurled OpenGraph card of a linked page, shared by every resource linking there (see resources/previews.py) """
+    url = models.URLField(unique=True)
+    title = models.CharField(max_length=300, blank=True)
+    description = models.TextField(blank=True)
+    image = models.URLField(max_length=1000, blank=True)
+    fetched_at = models.DateTimeField()
+    # Why the last fetch failed; empty when it succeeded
+    error = models.TextField(blank=True)
+
+    @property
+    def ok(self):
+        return not self.error
+
+    def __str__(self):
+        return self.url
+
+
 class Resource(models.Model):
+    LINK_UNCHECKED = 'unchecked'
+    LINK_OK = 'ok'
+    LINK_BROKEN = 'broken'
+    LINK_UNREACHABLE = 'unreachable'
+    LINK_STATUS_CHOICES = [
+        (LINK_UNCHECKED, 'Unchecked'),
+        (LINK_OK, 'OK'),
+        (LINK_BROKEN, 'Broken'),
+        (LINK_UNREACHABLE, 'Unreachable'),
+    ]
+
     CATEGORY_CHOICES = [
         ('protocols', 'Protocols'),
         ('templates', 'Templates'),
@@ -16,6 +45,21 @@ class Resource(models.Model):
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     image_url = models.URLField(blank=True, null=True)
     link = models.URLField(blank=True, null=True)
+    # Set in the background once `link` is unfurled
+    preview = models.ForeignKey(
+        ResourcePreview,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='resources'
+    )
+    # Last result of `check_resource_links` (see resources/linkcheck.py); the validators are
+    # replayed as If-None-Match / If-Modified-Since on the next check
+    link_status = models.CharField(max_length=12, choices=LINK_STATUS_CHOICES, default=LINK_UNCHECKED)
+    link_http_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    link_checked_at = models.DateTimeField(null=True, blank=True)
+    link_etag = models.CharField(max_length=255, blank=True)
+    link_last_modified = models.CharField(max_length=64, blank=True)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -26,6 +70,11 @@ class Resource(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Stalest links first
+            models.Index(fields=['link_checked_at'], name='resource_link_checked_idx'),
+            models.Index(fields=['link_status', '-created_at'], name='resource_link_status_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -0,0 +1,292 @@
+"""
+Link previews (OpenGraph title, description and image) for Resource.link.
+
+Creating or editing a resource queues `unfurl_resource` on the 'previews'
+pool, so clients no longer fetch every linked page to draw a card. Pages
+are fetched concurrently by an asyncio gather, bounded by
+RESOURCE_PREVIEW_CONCURRENCY and RESOURCE_PREVIEW_TIMEOUT. The fetching
+itself goes through a pluggable transport (RESOURCE_PREVIEW_TRANSPORT)
+whose default keeps one bounded urllib3 connection pool per process.
+Results are stored per URL in ResourcePreview and shared by every resource
+that links there. `refresh_resource_previews` refetches those older than
+RESOURCE_PREVIEW_TTL.
+"""
+import asyncio
+import ipaddress
+import logging
+import socket
+import threading
+from datetime import timedelta
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+import urllib3
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Resource, ResourcePreview
+
+logger = logging.getLogger(__name__)
+
+
+class FetchError(Exception):
+    pass
+
+
+def is_public_address(address):
+    return ipaddress.ip_address(address.split('%')[0]).is_global
+
+
+class Urllib3Transport:
+    """
+    Fetch pages over a shared, bounded urllib3 pool. Only http(s) URLs of public
+    addresses are fetched unless RESOURCE_PREVIEW_ALLOW_PRIVATE is set, and at most
+    RESOURCE_PREVIEW_MAX_BYTES of each body is read.
+
+    Redirects are followed here rather than by urllib3 so that every hop is
+    checked, and each request connects to the very address that was checked
+    (keeping the hostname for Host, SNI and certificate checks), which leaves
+    DNS rebinding no window between check and connect.
+    """
+    max_redirects = 3
+    redirect_statuses = {301, 302, 303, 307, 308}
+
+    def __init__(self):
+        self.pool = urllib3.PoolManager(
+            # Per-address pools kept around; the link checker walks many hosts
+            num_pools=100,
+            maxsize=settings.RESOURCE_PREVIEW_CONCURRENCY,
+            block=True,
+            retries=urllib3.Retry(total=2, redirect=False, backoff_factor=0.2),
+            timeout=urllib3.Timeout(connect=settings.RESOURCE_PREVIEW_TIMEOUT, read=settings.RESOURCE_PREVIEW_TIMEOUT),
+            headers={'User-Agent': 'LabLinker link preview', 'Accept': 'text/html,application/xhtml+xml'},
+        )
+
+    def check_url(self, url):
+        """ The address to connect to for `url`; raises FetchError for URLs that may not be fetched """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise FetchError(f'Not an http(s) URL: {url}')
+        if settings.RESOURCE_PREVIEW_ALLOW_PRIVATE:
+            return parts.hostname
+        try:
+            addresses = [info[4][0] for info in socket.getaddrinfo(parts.hostname, parts.port or 443)]
+        except OSError as exc:
+            raise FetchError(f'Cannot resolve {parts.hostname}: {exc}')
+        if not addresses or not all(is_public_address(address) for address in addresses):
+            raise FetchError(f'Refusing to fetch non-public host {parts.hostname}')
+        return addresses[0]
+
+    def _send(self, method, url, headers):
+        parts = urlsplit(url)
+        address = self.check_url(url)
+        pool_kwargs = None
+        if parts.scheme == 'https':
+            pool_kwargs = {'server_hostname': parts.hostname, 'assert_hostname': parts.hostname}
+        host = f'[{parts.hostname}]' if ':' in parts.hostname else parts.hostname
+        if parts.port:
+            host = f'{host}:{parts.port}'
+        path = parts.path or '/'
+        if parts.query:
+            path = f'{path}?{parts.query}'
+        try:
+            pool = self.pool.connection_from_host(address, parts.port, parts.scheme, pool_kwargs=pool_kwargs)
+            return pool.urlopen(method, path, headers={**self.pool.headers, **headers, 'Host': host},
+                                redirect=False, preload_content=False)
+        except urllib3.exceptions.HTTPError as exc:
+            raise FetchError(str(exc))
+
+    def _open(self, method, url, headers=None):
+        """ (final URL, response with its body unread), following redirects one checked hop at a time """
+        headers = headers or {}
+        for _ in range(self.max_redirects + 1):
+            response = self._send(method, url, headers)
+            location = response.headers.get('Location')
+            if response.status not in self.redirect_statuses or not location:
+                return url, response
+            response.drain_conn()
+            response.release_conn()
+            url = urljoin(url, location)
+            if response.status == 303 and method != 'HEAD':
+                method = 'GET'
+        raise FetchError(f'More than {self.max_redirects} redirects')
+
+    def request(self, method, url, headers=None):
+        """ (status, response headers) without reading the body """
+        _, response = self._open(method, url, headers)
+        if method == 'HEAD':
+            response.release_conn()
+        else:
+            # An unread body would poison the pooled connection
+            response.close()
+        return response.status, response.headers
+
+    def fetch(self, url):
+        """ (final URL, content type, body bytes) """
+        final_url, response = self._open('GET', url)
+        try:
+            if response.status >= 400:
+                raise FetchError(f'HTTP {response.status}')
+            body = response.read(settings.RESOURCE_PREVIEW_MAX_BYTES, decode_content=True)
+            return final_url, response.headers.get('Content-Type', ''), body
+        finally:
+            response.release_conn()
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport():
+    """ The process-wide instance of the RESOURCE_PREVIEW_TRANSPORT class """
+    path = settings.RESOURCE_PREVIEW_TRANSPORT
+    with _transports_lock:
+        if path not in _transports:
+            _transports[path] = import_string(path)()
+        return _transports[path]
+
+
+class OpenGraphParser(HTMLParser):
+    """ og:title/description/image, falling back to <title> and <meta name="description"> """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self.title = ''
+        self.in_title = False
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'meta':
+            key = (attrs.get('property') or attrs.get('name') or '').lower()
+            if key and attrs.get('content') and key not in self.meta:
+                self.meta[key] = attrs['content'].strip()
+        elif tag == 'title':
+            self.in_title = True
+        elif tag == 'body':
+            # Everything a preview needs lives in <head>
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self.in_title = False
+        elif tag == 'head':
+            self.done = True
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+
+    def feed_until_body(self, html):
+        for start in range(0, len(html), 8192):
+            self.feed(html[start:start + 8192])
+            if self.done:
+                break
+        return {
+            'title': self.meta.get('og:title') or ' '.join(self.title.split()),
+            'description': self.meta.get('og:description') or self.meta.get('description', ''),
+            'image': self.meta.get('og:image') or self.meta.get('twitter:image', ''),
+        }
+
+
+def parse_preview(url, content_type, body):
+    if 'html' not in content_type.lower():
+        raise FetchError(f'Not an HTML page: {content_type or "unknown type"}')
+    charset = 'utf-8'
+    for part in content_type.split(';')[1:]:
+        name, _, value = part.strip().partition('=')
+        if name.lower() == 'charset' and value:
+            charset = value.strip('"\'')
+    try:
+        html = body.decode(charset, errors='replace')
+    except LookupError:
+        html = body.decode('utf-8', errors='replace')
+    fields = OpenGraphParser().feed_until_body(html)
+    if fields['image']:
+        fields['image'] = urljoin(url, fields['image'])
+        # Clients render it as an <img>; javascript: or data: URLs are not stored
+        if urlsplit(fields['image']).scheme not in ('http', 'https'):
+            fields['image'] = ''
+    return {
+        'title': fields['title'][:300],
+        'description': fields['description'][:1000],
+        'image': fields['image'][:1000],
+    }
+
+
+async def _fetch_one(transport, limit, url):
+    async with limit:
+        try:
+            final_url, content_type, body = await asyncio.wait_for(
+                asyncio.to_thread(transport.fetch, url), settings.RESOURCE_PREVIEW_TIMEOUT * 2,
+            )
+            return url, parse_preview(final_url, content_type, body), ''
+        except (FetchError, asyncio.TimeoutError) as exc:
+            return url, None, str(exc) or 'Timed out'
+        except Exception as exc:
+            logger.warning("Unfurling %s failed", url, exc_info=True)
+            return url, None, repr(exc)
+
+
+async def _fetch_all(urls):
+    transport = get_transport()
+    limit = asyncio.Semaphore(settings.RESOURCE_PREVIEW_CONCURRENCY)
+    return await asyncio.gather(*(_fetch_one(transport, limit, url) for url in urls))
+
+
+def fetch_previews(urls):
+    """ Fetch `urls` concurrently and store a ResourcePreview for each; returns {url: preview} """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    previews = {}
+    for url, fields, error in asyncio.run(_fetch_all(urls)):
+        if fields is None and ResourcePreview.objects.filter(url=url, error='').update(fetched_at=timezone.now()):
+            # Keep serving the last good card through a failed refresh; retried after the TTL
+            logger.info("Refreshing the preview of %s failed: %s", url, error)
+            previews[url] = ResourcePreview.objects.get(url=url)
+            continue
+        defaults = {'fetched_at': timezone.now(), 'error': error[:1000]}
+        defaults.update(fields or {'title': '', 'description': '', 'image': ''})
+        previews[url], _ = ResourcePreview.objects.update_or_create(url=url, defaults=defaults)
+    return previews
+
+
+def is_fresh(preview):
+    return preview.fetched_at > timezone.now() - timedelta(seconds=settings.RESOURCE_PREVIEW_TTL)
+
+
+def attach_previews(previews):
+    """ Point the resources linking to each fetched URL at its preview (or at none, if it failed) """
+    for url, preview in previews.items():
+        Resource.objects.filter(link=url).update(preview=preview if preview.ok else None)
+
+
+def unfurl_resource(resource_id):
+    """ Give a created or edited resource the preview of its link """
+    resource = Resource.objects.filter(id=resource_id).only('id', 'link', 'preview_id').first()
+    if resource is None:
+        return
+    if not resource.link:
+        if resource.preview_id:
+            Resource.objects.filter(id=resource_id).update(preview=None)
+        return
+    preview = ResourcePreview.objects.filter(url=resource.link).first()
+    if preview is None or not is_fresh(preview):
+        preview = fetch_previews([resource.link])[resource.link]
+    # Only if the link was not edited again in the meantime
+    Resource.objects.filter(id=resource_id, link=resource.link).update(preview=preview if preview.ok else None)
+
+
+def stale_urls(limit=None):
+    """ Links whose preview is missing or older than RESOURCE_PREVIEW_TTL """
+    cutoff = timezone.now() - timedelta(seconds=settings.RESOURCE_PREVIEW_TTL)
+    fresh = ResourcePreview.objects.filter(fetched_at__gt=cutoff).values('url')
+    urls = (
+        Resource.objects.exclude(Q(link__isnull=True) | Q(link=''))
+        .exclude(link__in=fresh).order_by().values_list('link', flat=True).distinct()
+    )
+    return list(urls[:limit] if limit else urls)
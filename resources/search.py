@@ -0,0 +1,3 @@
+from lablinker.search import FullTextIndex
+
+resource_index = FullTextIndex('resources', table='resources_resource', columns=['title', 'description'])
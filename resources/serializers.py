@@ -1,19 +1,42 @@
+from django.db.models.manager import BaseManager
 from rest_framework import serializers
-from .models import Resource
-from auth_app.serializers import UserSerializer
+from .models import Resource, ResourcePreview
+from auth_app.loader import UserLoader
+from auth_app.serializers import EmbeddedUserField
+from lablinker.viewer_state import ViewerState
+
+
+class ResourceListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        resources = list(data.all() if isinstance(data, BaseManager) else data)
+        creator_ids = [resource.created_by_id for resource in resources]
+        request = self.context.get('request')
+        ViewerState.for_request(request).prime('following', creator_ids)
+        UserLoader.for_request(request).want(creator_ids)
+        return super().to_representation(resources)
+
+
+class ResourcePreviewSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ResourcePreview
+        fields = ['url', 'title', 'description', 'image', 'fetched_at']
 
 
 class ResourceSerializer(serializers.ModelSerializer):
-    created_by = UserSerializer(read_only=True)
+    created_by = EmbeddedUserField()
+    # Null until the link has been unfurled, or when it could not be
+    preview = ResourcePreviewSerializer(read_only=True)
     
     class Meta:
         model = Resource
         fields = [
             'id', 'title', 'description', 'category', 
-            'image_url', 'link', 'created_by', 
+            'image_url', 'link', 'preview', 'link_status', 'link_checked_at', 'created_by', 
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_by', 'created_at', 'updated_at']
+        read_only_fields = ['created_by', 'preview', 'link_status', 'link_checked_at', 'created_at', 'updated_at']
+        list_serializer_class = ResourceListSerializer
 
 
 class ResourceCreateSerializer(serializers.ModelSerializer):
@@ -1,3 +1,223 @@
-from django.test import TestCase
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from auth_app.models import CustomUser
+from .linkcheck import stale_links
+from .models import Resource, ResourcePreview
+from .previews import FetchError, Urllib3Transport
+from .views import ResourceViewSet
+
+PAGES = {
+    '/paper': ('text/html; charset=utf-8', b'''<html><head>
+        <title>Fallback title</title>
+        <meta property="og:title" content="CRISPR screening protocol">
+        <meta name="description" content="Step by step">
+        <meta property="og:image" content="/cover.png">
+        </head><body><meta property="og:title" content="ignored"></body></html>'''),
+    '/data.csv': ('text/csv', b'a,b\n1,2\n'),
+    '/script-image': ('text/html', b'<head><meta property="og:image" content="javascript:alert(1)"></head>'),
+}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # (method, path, status) of every request served
+    log = []
+    # path -> Location
+    redirects = {}
+
+    def respond(self, send_body):
+        if self.path in self.redirects:
+            self.send_response(302)
+            self.send_header('Location', self.redirects[self.path])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            self.log.append((self.command, self.path, 302))
+            return
+        if self.path not in PAGES:
+            self.send_error(404)
+            self.log.append((self.command, self.path, 404))
+            return
+        content_type, body = PAGES[self.path]
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            self.log.append((self.command, self.path, 304))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+        self.log.append((self.command, self.path, 200))
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        if self.path == '/data.csv':
+            # A server that does not do HEAD
+            self.send_error(405)
+            self.log.append((self.command, self.path, 405))
+            return
+        self.respond(send_body=False)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, RESOURCE_PREVIEW_ALLOW_PRIVATE=True)
+class ResourceLinkTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            CustomUser.objects.create_user(username='mo', email='mo@example.com', password='pw')
+        )
+
+    def create(self, link):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('resource-list'), {
+                'title': 'Screen', 'description': 'Protocol', 'category': 'protocols', 'link': link,
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return self.client.get(reverse('resource-list')).data[0]
+
+    def test_links_are_unfurled_on_create_and_shared(self):
+        resource = self.create(f'{self.base_url}/paper')
+        self.assertEqual(resource['preview']['title'], 'CRISPR screening protocol')
+        self.assertEqual(resource['preview']['description'], 'Step by step')
+        self.assertEqual(resource['preview']['image'], f'{self.base_url}/cover.png')
+
+        self.create(f'{self.base_url}/paper')
+        self.assertEqual(ResourcePreview.objects.count(), 1)
+
+    def test_unusable_links_get_no_preview(self):
+        self.assertIsNone(self.create(f'{self.base_url}/data.csv')['preview'])
+        self.assertIsNone(self.create(f'{self.base_url}/missing')['preview'])
+        self.assertEqual(
+            sorted(ResourcePreview.objects.values_list('error', flat=True)),
+            ['HTTP 404', 'Not an HTML page: text/csv'],
+        )
+
+    def test_redirects_are_checked_hop_by_hop(self):
+        StandInHandler.redirects['/hop'] = '/paper'
+        self.addCleanup(StandInHandler.redirects.clear)
+        transport = Urllib3Transport()
+        final_url, _, _ = transport.fetch(f'{self.base_url}/hop')
+        self.assertEqual(final_url, f'{self.base_url}/paper')
+
+        # A public page redirecting somewhere private is not followed there
+        StandInHandler.redirects['/hop'] = f'http://127.0.0.2:{self.server.server_port}/paper'
+        with override_settings(RESOURCE_PREVIEW_ALLOW_PRIVATE=False), \
+                mock.patch('resources.previews.is_public_address', lambda address: address == '127.0.0.1'), \
+                self.assertRaisesMessage(FetchError, 'non-public host 127.0.0.2'):
+            transport.fetch(f'{self.base_url}/hop')
+
+    def test_non_http_images_are_dropped(self):
+        self.assertEqual(self.create(f'{self.base_url}/script-image')['preview']['image'], '')
+
+    def test_links_are_checked_conditionally_with_get_fallback(self):
+        user = CustomUser.objects.get(username='mo')
+        for path in ('/paper', '/paper', '/data.csv', '/gone'):
+            Resource.objects.create(title=path, description='', category='links', link=f'{self.base_url}{path}',
+                                    created_by=user)
+        StandInHandler.log.clear()
+
+        out = StringIO()
+        call_command('check_resource_links', stdout=out)
+        self.assertIn('Checked 3 links: 1 broken, 2 ok.', out.getvalue())
+        self.assertEqual(sorted(StandInHandler.log), [
+            ('GET', '/data.csv', 200), ('GET', '/gone', 404), ('HEAD', '/data.csv', 405),
+            ('HEAD', '/gone', 404), ('HEAD', '/paper', 200),
+        ])
+        response = self.client.get(reverse('resource-list'), {'link_status': 'broken'})
+        self.assertEqual([resource['title'] for resource in response.data], ['/gone'])
+
+        # Nothing is stale yet; a forced pass revalidates with the stored ETag
+        call_command('check_resource_links', stdout=out)
+        self.assertIn('nothing to do', out.getvalue())
+        StandInHandler.log.clear()
+        call_command('check_resource_links', '--all', stdout=out)
+        self.assertIn(('HEAD', '/paper', 304), StandInHandler.log)
+        self.assertEqual(Resource.objects.filter(link_status=Resource.LINK_OK).count(), 3)
+
+    def test_link_edited_during_a_pass_keeps_waiting_for_its_own_check(self):
+        user = CustomUser.objects.get(username='mo')
+        resource = Resource.objects.create(title='Moved', description='', category='links',
+                                           link=f'{self.base_url}/paper', created_by=user)
+
+        def read_then_edit(*args):
+            links = stale_links(*args)
+            Resource.objects.filter(id=resource.id).update(link=f'{self.base_url}/data.csv')
+            return links
+
+        with mock.patch('resources.linkcheck.stale_links', read_then_edit):
+            call_command('check_resource_links', stdout=StringIO())
+        resource.refresh_from_db()
+        self.assertEqual((resource.link_status, resource.link_checked_at), (Resource.LINK_UNCHECKED, None))
+
+
+class ResourceSearchTestCase(TestCase):
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='ned', email='ned@example.com', password='pw')
+        rows = [
+            ('CRISPR knockout protocol', 'Guide design and CRISPR screening, CRISPR controls', 'protocols'),
+            ('Plasmid prep', 'Miniprep for CRISPR plasmids', 'protocols'),
+            ('CRISPR review', 'Background reading', 'articles'),
+            ('Western blot', 'Transfer and imaging', 'protocols'),
+        ]
+        self.ids = {
+            title: Resource.objects.create(title=title, description=description, category=category,
+                                           created_by=user).id
+            for title, description, category in rows
+        }
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def titles(self, **params):
+        return [resource['title'] for resource in self.client.get(reverse('resource-list'), params).data]
+
+    def test_search_is_ranked_prefix_matched_and_combines_with_filters(self):
+        self.assertEqual(self.titles(search='crisp'), ['CRISPR knockout protocol', 'CRISPR review', 'Plasmid prep'])
+        self.assertEqual(self.titles(search='crispr plasmid'), ['Plasmid prep'])
+        self.assertEqual(self.titles(search='crispr', category='articles'), ['CRISPR review'])
+        self.assertEqual(self.titles(search='nothing-like-this'), [])
+
+        # The list is not paginated: searches are capped, and say so when cut off
+        self.assertNotIn('X-Search-Truncated', self.client.get(reverse('resource-list'), {'search': 'crisp'}))
+        with mock.patch.object(ResourceViewSet, 'search_max_results', 2):
+            response = self.client.get(reverse('resource-list'), {'search': 'crisp'})
+        self.assertEqual([resource['title'] for resource in response.data], ['CRISPR knockout protocol', 'CRISPR review'])
+        self.assertEqual(response['X-Search-Truncated'], '2')
+
+        # Edits are indexed by the database triggers
+        Resource.objects.filter(id=self.ids['Western blot']).update(title='Western blot after CRISPR')
+        self.assertIn('Western blot after CRISPR', self.titles(search='crispr'))
+
+    def test_ordering_still_applies_without_search(self):
+        self.assertEqual(self.titles(ordering='title'),
+                         ['CRISPR knockout protocol', 'CRISPR review', 'Plasmid prep', 'Western blot'])
@@ -1,18 +1,30 @@
+from django.db.models import Count, Max
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 
+from lablinker import background
+from lablinker.conditional import ConditionalGetMixin
+from lablinker.search import FullTextSearchFilter
+from posts import cache as post_cache
 from .models import Resource
+from .previews import unfurl_resource
+from .search import resource_index
 from .serializers import ResourceSerializer, ResourceCreateSerializer
 
 
-class ResourceViewSet(viewsets.ModelViewSet):
+class ResourceViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Resource.objects.all()
     serializer_class = ResourceSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [SearchFilter, OrderingFilter]
-    search_fields = ['title', 'description']
+    # ?search= is ranked full-text search over title and description (see resources/search.py).
+    # The list is not paginated, so a search returns its best search_max_results matches and
+    # says so with X-Search-Truncated when there were more.
+    filter_backends = [OrderingFilter, FullTextSearchFilter]
+    search_index = resource_index
+    search_max_results = 100
+    search_truncated = False
     ordering_fields = ['created_at', 'title']
     ordering = ['-created_at']
 
@@ -22,14 +34,54 @@ class ResourceViewSet(viewsets.ModelViewSet):
         return ResourceSerializer
 
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        resource = serializer.save(created_by=self.request.user)
+        if resource.link:
+            background.submit_on_commit(unfurl_resource, resource.id, pool='previews')
+
+    def perform_update(self, serializer):
+        old_link = serializer.instance.link
+        if serializer.validated_data.get('link', old_link) == old_link:
+            serializer.save()
+            return
+        # A new link starts over: unchecked, and unfurled again
+        resource = serializer.save(
+            link_status=Resource.LINK_UNCHECKED, link_http_status=None, link_checked_at=None,
+            link_etag='', link_last_modified='',
+        )
+        background.submit_on_commit(unfurl_resource, resource.id, pool='previews')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.search_truncated:
+            response.headers['X-Search-Truncated'] = str(self.search_max_results)
+        return response
+
+    def get_validators(self, request):
+        if self.action not in ('list', 'my_resources'):
+            return None
+        # Previews and link checks are stored in the background without touching updated_at
+        stats = Resource.objects.aggregate(
+            total=Count('id'), latest=Max('updated_at'),
+            previews=Count('preview'), previewed=Max('preview__fetched_at'), link_checked=Max('link_checked_at'),
+        )
+        validators = (
+            stats['total'], stats['latest'], stats['previews'], stats['previewed'], stats['link_checked'],
+            # Authors are embedded; their edits and follower counts bump the collection version
+            post_cache.collection_version(),
+        )
+        # No Last-Modified: deleting an older resource leaves Max(updated_at) unchanged
+        return validators, None
 
     def get_queryset(self):
-        queryset = Resource.objects.select_related('created_by').all()
+        queryset = Resource.objects.select_related('preview')
         # Filter by category if provided
         category = self.request.query_params.get('category', None)
         if category:
             queryset = queryset.filter(category=category)
+        # Filter by the last link check: ok, broken, unreachable or unchecked
+        link_status = self.request.query_params.get('link_status', None)
+        if link_status:
+            queryset = queryset.filter(link_status=link_status)
         return queryset
 
     @action(detail=False, methods=['get'])
@@ -0,0 +1,66 @@
+"""
+User directory: keyset pages ordered by username, filtered on profession and
+country, plus facet counts for both filters.
+
+Facets come from a single GROUP BY (profession, country) over all users.
+It is cached for USER_DIRECTORY_FACETS_TIMEOUT seconds and dropped whenever
+a user is saved or deleted. Counts for any filter combination are derived
+from that one aggregate: the profession counts honour the country filter,
+and vice versa.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from lablinker.pagination import KeysetPagination
+
+FACETS = ('profession', 'country')
+FACETS_KEY = 'user-directory:facets'
+
+
+class UserDirectoryPagination(KeysetPagination):
+    ordering = ('username', 'id')
+
+
+def filter_users(queryset, params):
+    for facet in FACETS:
+        value = params.get(facet)
+        if value:
+            queryset = queryset.filter(**{facet: value})
+    return queryset
+
+
+def facet_groups():
+    """ [(profession, country, count)] for every pair in use """
+    groups = cache.get(FACETS_KEY)
+    if groups is None:
+        groups = [
+            (row['profession'], row['country'], row['count'])
+            for row in get_user_model().objects.order_by().values(*FACETS).annotate(count=Count('id'))
+        ]
+        cache.set(FACETS_KEY, groups, settings.USER_DIRECTORY_FACETS_TIMEOUT)
+    return groups
+
+
+def facet_counts(params):
+    """ {facet: [{'value', 'count'}]}, busiest first; each facet filtered by the others """
+    counts = {facet: Counter() for facet in FACETS}
+    for *values, count in facet_groups():
+        row = dict(zip(FACETS, values))
+        for facet in FACETS:
+            if not row[facet]:
+                continue
+            if all(not params.get(other) or row[other] == params.get(other) for other in FACETS if other != facet):
+                counts[facet][row[facet]] += count
+    return {
+        facet: [{'value': value, 'count': count} for value, count in sorted(counter.items(), key=lambda item: (-item[1], item[0]))]
+        for facet, counter in counts.items()
+    }
+
+
+def invalidate_facets_on_commit():
+    transaction.on_commit(lambda: cache.delete(FACETS_KEY))
@@ -1,13 +1,25 @@
 from rest_framework import serializers
 
 from auth_app.models import CustomUser
+from mediastore.renditions import preferred_url, rendition_urls, wants_originals
 
 class UserSerializer(serializers.ModelSerializer):
     avatar_url = serializers.SerializerMethodField()
+    avatar_srcset = serializers.SerializerMethodField()
+    avatar_original_url = serializers.SerializerMethodField()
 
     def get_avatar_url(self, obj):
-        return obj.avatar.url if obj.avatar else None
+        return preferred_url(obj.avatar, obj.avatar_renditions, 'thumb')
+
+    def get_avatar_srcset(self, obj):
+        return rendition_urls(obj.avatar_renditions)
+
+    def get_avatar_original_url(self, obj):
+        if obj.avatar and wants_originals(self.context.get('request')):
+            return obj.avatar.url
+        return None
     
     class Meta:
         model = CustomUser
-        fields = ['id', 'email', 'username', 'first_name', 'last_name', 'profession', 'country','avatar', 'avatar_url']
+        fields = ['id', 'email', 'username', 'first_name', 'last_name', 'profession', 'country','avatar', 'avatar_url', 'avatar_srcset', 'avatar_original_url']
+        extra_kwargs = {'avatar': {'write_only': True}}
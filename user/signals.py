@@ -0,0 +1,19 @@
+"""
+Drop the cached directory facets (see user/directory.py) when users change.
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from .directory import invalidate_facets_on_commit
+
+
+def invalidate_facets(sender, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no facet counts
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_facets_on_commit()
+
+
+def connect_signals():
+    for signal in (post_save, post_delete):
+        signal.connect(invalidate_facets, sender=settings.AUTH_USER_MODEL)
@@ -1,4 +1,6 @@
 # tests.py in your 'user' app
+import json
+
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
@@ -92,3 +94,64 @@ class UserViewsTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+
+
+class UserDirectoryTestCase(TestCase):
+
+    def setUp(self):
+        people = [
+            ('ana', 'virologist', 'Peru'), ('bo', 'virologist', 'Chile'), ('cy', 'chemist', 'Peru'),
+            ('di', 'virologist', 'Peru'), ('ed', '', ''),
+        ]
+        for username, profession, country in people:
+            get_user_model().objects.create_user(
+                username=username, email=f'{username}@example.com', password='pw',
+                profession=profession, country=country,
+            )
+        self.client = APIClient()
+        self.url = reverse('get_all_users')
+
+    def test_directory_pages_filters_and_facets(self):
+        response = self.client.get(self.url, {'profession': 'virologist', 'page_size': 2})
+        self.assertEqual([u['username'] for u in response.data['results']], ['ana', 'bo'])
+        self.assertEqual(response.data['facets'], {
+            'profession': [{'value': 'virologist', 'count': 3}, {'value': 'chemist', 'count': 1}],
+            'country': [{'value': 'Peru', 'count': 2}, {'value': 'Chile', 'count': 1}],
+        })
+        response = self.client.get(response.data['next'])
+        self.assertEqual([u['username'] for u in response.data['results']], ['di'])
+
+        # Facets are cached: only the page is queried
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {'country': 'Peru'})
+        with self.captureOnCommitCallbacks(execute=True):
+            get_user_model().objects.get(username='ed').save()
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'country': 'Peru'})
+        self.assertEqual(response.data['facets']['profession'],
+                         [{'value': 'virologist', 'count': 2}, {'value': 'chemist', 'count': 1}])
+
+    def test_ndjson_export_is_admin_only(self):
+        self.assertEqual(self.client.get(self.url, {'export': 'ndjson'}).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(get_user_model().objects.create_user(
+            username='root', email='root@example.com', password='pw', is_staff=True))
+        response = self.client.get(self.url, {'export': 'ndjson', 'country': 'Peru'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['ana', 'cy', 'di'])
+
+
+class UserBatchTestCase(TestCase):
+
+    def test_batch_returns_requested_users_in_order_with_one_query(self):
+        users = [
+            get_user_model().objects.create_user(username=name, email=f'{name}@example.com', password='pw')
+            for name in ('fay', 'gus', 'hal')
+        ]
+        url = reverse('user-batch')
+        with self.assertNumQueries(1):
+            response = APIClient().get(url, {'ids': f'{users[2].id},{users[0].id},999,{users[2].id}'})
+        self.assertEqual([user['username'] for user in response.data], ['hal', 'fay'])
+
+        self.assertEqual(APIClient().get(url, {'ids': '1,x'}).status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import GetAllUsersView, UserView
+from .views import GetAllUsersView, UserBatchView, UserView
 
 urlpatterns = [
     path('', GetAllUsersView.as_view(), name='get_all_users'),  # List all users
+    path('batch/', UserBatchView.as_view(), name='user-batch'),  # Fetch several users by ID
     path('<int:user_id>/', UserView.as_view(), name='get_user_by_id'),  # Fetch a user by ID
 ]
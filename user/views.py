@@ -1,16 +1,67 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from .directory import UserDirectoryPagination, facet_counts, filter_users
 from .serializers import UserSerializer
 from rest_framework.permissions import IsAuthenticatedOrReadOnly 
+from lablinker import background
+from mediastore.renditions import render_instance_renditions
 
 class GetAllUsersView(APIView):
+    """
+    User directory, a page at a time in username order, filtered by ?profession= and ?country=
+    and with facet counts for both. Admins can stream the filtered users as NDJSON with
+    ?export=ndjson.
+    """
+
+    def get(self, request):
+        users = filter_users(get_user_model().objects.all(), request.query_params)
+        if request.query_params.get('export') == 'ndjson':
+            return self.export(request, users)
+
+        paginator = UserDirectoryPagination()
+        page = paginator.paginate_queryset(users, request, view=self)
+        serializer = UserSerializer(page, many=True, context={'request': request})
+        response = paginator.get_paginated_response(serializer.data)
+        response.data['facets'] = facet_counts(request.query_params)
+        return response
+
+    def export(self, request, users):
+        if not (request.user and request.user.is_staff):
+            raise PermissionDenied()
+
+        def rows():
+            # Rows are fetched and serialized a chunk at a time, so memory stays flat
+            for user in users.order_by('id').iterator(chunk_size=settings.USER_EXPORT_CHUNK_SIZE):
+                yield json.dumps(UserSerializer(user).data) + '\n'
+
+        response = StreamingHttpResponse(rows(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="users.ndjson"'
+        return response
+
+
+class UserBatchView(APIView):
+    """ Several users in one call: ?ids=1,2,3, answered in that order; unknown ids are left out """
+
     def get(self, request):
-        users = get_user_model().objects.all()  # Fetch all users
-        serializer = UserSerializer(users, many=True)  # Serialize the users
-        return Response(serializer.data, status=status.HTTP_200_OK)    
+        try:
+            ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            raise ValidationError({'ids': 'Expected a comma-separated list of user ids.'})
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > settings.USER_BATCH_MAX_IDS:
+            raise ValidationError({'ids': f'At most {settings.USER_BATCH_MAX_IDS} ids per request.'})
+
+        users = get_user_model().objects.in_bulk(ids)
+        serializer = UserSerializer([users[user_id] for user_id in ids if user_id in users], many=True,
+                                    context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class UserView(APIView):
@@ -18,7 +69,7 @@ class UserView(APIView):
     def get(self, request, user_id):
         try:
             user = get_user_model().objects.get(id=user_id)  # Fetch user by ID
-            serializer = UserSerializer(user)  # Serialize the single user
+            serializer = UserSerializer(user, context={'request': request})  # Serialize the single user
             return Response(serializer.data, status=status.HTTP_200_OK)
         except get_user_model().DoesNotExist:
             raise NotFound(detail="User not found.")
@@ -30,9 +81,17 @@ class UserView(APIView):
         except get_user_model().DoesNotExist:
             raise NotFound(detail="User not found.")
         
-        serializer = UserSerializer(user, data=request.data, partial=True)  # Use partial=True for partial updates
+        serializer = UserSerializer(user, data=request.data, partial=True, context={'request': request})  # Use partial=True for partial updates
         if serializer.is_valid():
-            serializer.save()  # Save the updated user
+            if 'avatar' in request.data:
+                # Old derivatives no longer match; new ones are rendered off the request thread
+                serializer.save(avatar_renditions={})
+                background.submit_on_commit(
+                    render_instance_renditions, user._meta.label, user.id, 'avatar', 'avatar_renditions',
+                    pool='uploads',
+                )
+            else:
+                serializer.save()  # Save the updated user
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     